@@ -2,6 +2,7 @@ import os
 import sys
 import signal
 import asyncio
+import contextlib
 import uvicorn
 from telegram.ext import (
     Application,
@@ -10,8 +11,8 @@ from telegram.ext import (
     CallbackQueryHandler,
     filters,
 )
-from src.config import Config
-from src.database import init_db, get_db_info
+from src.config import Config, configure
+from src.database import init_db, close_db, get_db_info
 from src.handlers import (
     start_command,
     reset_command,
@@ -25,18 +26,45 @@ from src.handlers import (
     button_callback,
     error_handler,
 )
-from src.server import app
+from src.hf_client import close_client
+from src.server import app, mount_webhook
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Startup banner, parsed once and filled with format_map in post_init
+_BANNER_TMPL = (
+    "\n"
+    "╔══════════════════════════════════════════════╗\n"
+    "║            🤖 BOT ONLINE & READY             ║\n"
+    "╠══════════════════════════════════════════════╣\n"
+    "║ Username : @{username:<31}║\n"
+    "║ Name     : {first_name:<32}║\n"
+    "║ Bot ID   : {bot_id:<32}║\n"
+    "║ Model    : {model:<32}║\n"
+    "║ DB Users : {db_users:<32}║\n"
+    "║ DB Msgs  : {db_msgs:<32}║\n"
+    "║ DB Size  : {db_size:<32}║\n"
+    "║ Admins   : {admins:<32}║\n"
+    "║ Commands : {commands} registered                     ║\n"
+    "╚══════════════════════════════════════════════╝"
+)
+
 # ╔══════════════════════════════════════════════════════════╗
 # ║                 🌐 FASTAPI WEB SERVER                    ║
 # ╚══════════════════════════════════════════════════════════╝
 
-async def start_fastapi():
-    """Run lightweight FastAPI server for health checks (Railway/Render requires a web port)."""
+class _Server(uvicorn.Server):
+    """uvicorn server that leaves SIGINT/SIGTERM to main(), which sets should_exit."""
+
+    @contextlib.contextmanager
+    def capture_signals(self):
+        yield
+
+
+def build_server() -> uvicorn.Server:
+    """Lightweight FastAPI server for health checks (Railway/Render requires a web port)."""
     port = int(os.getenv("PORT", "8000"))
     config = uvicorn.Config(
         app,
@@ -44,10 +72,19 @@ async def start_fastapi():
         port=port,
         log_level="warning",
         access_log=False,
+        server_header=False,
+        date_header=False,
     )
-    server = uvicorn.Server(config)
-    logger.info(f"🌐 FastAPI health server starting on port {port}")
-    await server.serve()
+    logger.info("🌐 FastAPI health server starting on port %s", port)
+    return _Server(config)
+
+
+async def start_fastapi(server: uvicorn.Server, stopped: asyncio.Event):
+    """Serve until should_exit, then tell the bot the web side has drained."""
+    try:
+        await server.serve()
+    finally:
+        stopped.set()
 
 
 # ╔══════════════════════════════════════════════════════════╗
@@ -73,27 +110,26 @@ async def post_init(application: Application):
     await bot.set_my_commands(commands)
 
     # ── Startup banner ───────────────────────────────────────
-    db_info = await get_db_info()
-    logger.info(
-        f"\n"
-        f"╔══════════════════════════════════════════════╗\n"
-        f"║            🤖 BOT ONLINE & READY             ║\n"
-        f"╠══════════════════════════════════════════════╣\n"
-        f"║ Username : @{bot_info.username:<31}║\n"
-        f"║ Name     : {bot_info.first_name:<32}║\n"
-        f"║ Bot ID   : {bot_info.id:<32}║\n"
-        f"║ Model    : {Config.HF_MODEL.split('/')[-1]:<32}║\n"
-        f"║ DB Users : {db_info['total_users']:<32}║\n"
-        f"║ DB Msgs  : {db_info['total_messages']:<32}║\n"
-        f"║ DB Size  : {db_info['db_size']:<32}║\n"
-        f"║ Admins   : {len(Config.ADMIN_IDS):<32}║\n"
-        f"║ Commands : {len(commands)} registered{' ' * 21}║\n"
-        f"╚══════════════════════════════════════════════╝"
-    )
-
+    # Skip the DB probe and string building entirely when INFO is filtered out
+    if not logger.isEnabledFor(logging.INFO):
+        return
 
-async def start_bot():
-    """Initialize and run Telegram Bot with all handlers."""
+    db_info = await get_db_info()
+    logger.info(_BANNER_TMPL.format_map({
+        "username": bot_info.username,
+        "first_name": bot_info.first_name,
+        "bot_id": bot_info.id,
+        "model": Config.HF_MODEL_SHORT,
+        "db_users": db_info["total_users"],
+        "db_msgs": db_info["total_messages"],
+        "db_size": db_info["db_size"],
+        "admins": len(Config.ADMIN_IDS),
+        "commands": len(commands),
+    }))
+
+
+async def start_bot(stopped: asyncio.Event):
+    """Initialize and run Telegram Bot with all handlers until `stopped` is set."""
     # ── Database init ────────────────────────────────────────
     await init_db()
 
@@ -115,6 +151,14 @@ async def start_bot():
         .token(Config.BOT_TOKEN)
         .post_init(post_init)
         .job_queue(None)
+        .concurrent_updates(Config.MAX_CONCURRENT_UPDATES)
+        # ── HTTP pools: streaming edits need parallel sockets ──
+        .connection_pool_size(Config.TG_POOL_SIZE)
+        .pool_timeout(Config.TG_POOL_TIMEOUT)
+        .connect_timeout(10.0)
+        .read_timeout(30.0)
+        .get_updates_connection_pool_size(16)
+        .get_updates_pool_timeout(30.0)
         .build()
     )
 
@@ -132,7 +176,7 @@ async def start_bot():
 
     for cmd_name, cmd_func in command_handlers:
         application.add_handler(CommandHandler(cmd_name, cmd_func))
-        logger.debug(f"📌 Registered command: /{cmd_name}")
+        logger.debug("📌 Registered command: /%s", cmd_name)
 
     # ── Register message & callback handlers ─────────────────
     application.add_handler(
@@ -144,73 +188,126 @@ async def start_bot():
     application.add_error_handler(error_handler)
 
     logger.info(
-        f"📌 Registered {len(command_handlers)} commands, "
-        f"1 message handler, 1 callback handler, 1 error handler"
+        "📌 Registered %d commands, 1 message handler, 1 callback handler, 1 error handler",
+        len(command_handlers),
     )
 
-    # ── Start polling ────────────────────────────────────────
-    logger.info("🚀 Bot polling is starting...")
-
+    # ── Start update delivery ────────────────────────────────
     await application.initialize()
-    await application.start()
-    await application.updater.start_polling(
-        drop_pending_updates=True,
-        allowed_updates=["message", "callback_query"],
-    )
+    try:
+        # post_init only auto-runs under run_polling/run_webhook, so call it here
+        await post_init(application)
+        await application.start()
+
+        if Config.PUBLIC_URL:
+            # Telegram pushes updates to the FastAPI server — no getUpdates round-trips
+            mount_webhook(application)
+            # Registered only once the route and the update processor are live,
+            # otherwise Telegram's first pushes hit a 404
+            await application.bot.set_webhook(
+                url=f"{Config.PUBLIC_URL}/webhook/{Config.BOT_TOKEN}",
+                allowed_updates=["message", "callback_query"],
+                drop_pending_updates=True,
+                secret_token=Config.WEBHOOK_SECRET,
+            )
+            logger.info("🔗 Webhook set: %s/webhook/%s", Config.PUBLIC_URL, Config.BOT_TOKEN)
+            logger.info("🚀 Bot webhook delivery is active...")
+        else:
+            logger.info("🚀 Bot polling is starting...")
+            await application.updater.start_polling(
+                timeout=20,
+                drop_pending_updates=True,
+                allowed_updates=["message", "callback_query"],
+            )
+
+        # ── Serve until the web server has finished ──────────
+        # Webhook updates arrive via FastAPI, so stop only once it stopped accepting them
+        await stopped.wait()
+
+    finally:
+        # ── Graceful shutdown ────────────────────────────────
+        logger.info("🔄 Shutting down bot gracefully...")
+        if application.updater.running:
+            await application.updater.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        logger.info("✅ Bot shutdown complete.")
 
-    # ── Keep alive until shutdown signal ─────────────────────
-    stop_event = asyncio.Event()
 
-    # Handle graceful shutdown signals
-    def _signal_handler():
-        logger.info("🛑 Shutdown signal received...")
-        stop_event.set()
+# ╔══════════════════════════════════════════════════════════╗
+# ║                    🏁 MAIN ENTRY                         ║
+# ╚══════════════════════════════════════════════════════════╝
 
-    loop = asyncio.get_running_loop()
-    for sig in (signal.SIGINT, signal.SIGTERM):
-        try:
-            loop.add_signal_handler(sig, _signal_handler)
-        except NotImplementedError:
-            # Windows doesn't support add_signal_handler
-            pass
+def _install_signal_handlers(loop: asyncio.AbstractEventLoop, callback):
+    """Route shutdown signals to `callback` on the loop, on POSIX and Windows alike."""
+    if sys.platform != "win32":
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, callback)
+        return
 
-    await stop_event.wait()
+    # Windows has no loop.add_signal_handler — hop back onto the loop thread-safely
+    def _handler(signum, frame):
+        loop.call_soon_threadsafe(callback)
 
-    # ── Graceful shutdown ────────────────────────────────────
-    logger.info("🔄 Shutting down bot gracefully...")
-    await application.updater.stop()
-    await application.stop()
-    await application.shutdown()
-    logger.info("✅ Bot shutdown complete.")
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGBREAK):
+        signal.signal(sig, _handler)
 
 
-# ╔══════════════════════════════════════════════════════════╗
-# ║                    🏁 MAIN ENTRY                         ║
-# ╚══════════════════════════════════════════════════════════╝
-
 async def main():
     """Run both Bot and Web Server concurrently."""
+    configure()
     logger.info(
-        f"\n"
-        f"🏁 ═══════════════════════════════════════════\n"
-        f"   {Config.BOT_NAME} v{Config.BOT_VERSION} — Starting up...\n"
-        f"   Python {sys.version.split()[0]} | PID {os.getpid()}\n"
-        f"🏁 ═══════════════════════════════════════════"
+        "\n"
+        "🏁 ═══════════════════════════════════════════\n"
+        "   %s v%s — Starting up...\n"
+        "   Python %s | PID %d\n"
+        "🏁 ═══════════════════════════════════════════",
+        Config.BOT_NAME, Config.BOT_VERSION, sys.version.partition(" ")[0], os.getpid(),
     )
 
-    await asyncio.gather(
-        start_bot(),
-        start_fastapi(),
-    )
+    # ── Shutdown signals drain uvicorn, then the bot ─────────
+    # Cancelling the TaskGroup here would cut uvicorn's own graceful shutdown short
+    server = build_server()
+    stopped = asyncio.Event()
+
+    def _signal_handler():
+        if server.should_exit:
+            logger.warning("🛑 Second shutdown signal — forcing exit...")
+            server.force_exit = True
+            return
+        logger.info("🛑 Shutdown signal received...")
+        server.should_exit = True
+
+    _install_signal_handlers(asyncio.get_running_loop(), _signal_handler)
+
+    # A crash in either task cancels the other; each cleans up in its finally
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(start_bot(stopped))
+            tg.create_task(start_fastapi(server, stopped))
+        logger.info("👋 All services stopped. Bye!")
+    finally:
+        # aiosqlite runs on a non-daemon thread — close it or the process hangs
+        await close_db()
+        await close_client()
 
 
 if __name__ == "__main__":
+    # ── Faster event loop (libuv-backed) where available ─────
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            uvloop.install()
+        except ImportError:
+            logger.warning("⚠️ uvloop not installed — using default asyncio loop")
+
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logger.info("👋 Graceful shutdown via KeyboardInterrupt. Bye!")
     except SystemExit as e:
-        logger.info(f"🛑 System exit with code {e.code}")
+        logger.info("🛑 System exit with code %s", e.code)
     except Exception as e:
-        logger.critical(f"💥 Fatal error: {e}", exc_info=True)
+        logger.critical("💥 Fatal error: %s", e, exc_info=True)
         sys.exit(1)
\ No newline at end of file
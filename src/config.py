@@ -1,7 +1,13 @@
 import os
+import re
+import hashlib
 import sys
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from dataclasses import dataclass, field
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,80 +16,145 @@ load_dotenv()
 # ║               🤖 BOT CONFIGURATION CENTER               ║
 # ╚══════════════════════════════════════════════════════════╝
 
-class Config:
-    # ── Core Tokens ──────────────────────────────────────────
-    BOT_TOKEN = os.getenv("BOT_TOKEN", "")
-    HF_TOKEN = os.getenv("HF_TOKEN", "")
-    HF_MODEL = os.getenv("HF_MODEL", "meta-llama/Meta-Llama-3-8B-Instruct")
+def _env(name: str, default: str, cast=str):
+    """Field whose value is read from the environment when the config is built."""
+    return field(default_factory=lambda: cast(os.getenv(name, default)))
 
-    # ── Security & Admin ─────────────────────────────────────
+
+def _parse_admin_ids() -> frozenset[int]:
     try:
-        ADMIN_IDS = [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
+        return frozenset(
+            int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()
+        )
     except ValueError:
-        ADMIN_IDS = []
+        return frozenset()
 
-    MAX_INPUT_CHARS = int(os.getenv("MAX_USER_TOKENS", "2000"))
-    RATE_LIMIT = int(os.getenv("RATE_LIMIT_PER_MINUTE", "5"))
+
+@dataclass(frozen=True, slots=True)
+class _Config:
+    # ── Core Tokens ──────────────────────────────────────────
+    BOT_TOKEN: str = _env("BOT_TOKEN", "")
+    HF_TOKEN: str = _env("HF_TOKEN", "")
+    HF_MODEL: str = _env("HF_MODEL", "meta-llama/Meta-Llama-3-8B-Instruct")
+    HF_MODEL_SHORT: str = field(init=False)  # "org/name" -> "name", derived once
+
+    # ── Security & Admin ─────────────────────────────────────
+    # frozenset: O(1) `user_id in ADMIN_IDS` checks on every admin-gated handler
+    ADMIN_IDS: frozenset[int] = field(default_factory=_parse_admin_ids)
+
+    MAX_INPUT_CHARS: int = _env("MAX_USER_TOKENS", "2000", int)
+    RATE_LIMIT: int = _env("RATE_LIMIT_PER_MINUTE", "5", int)
 
     # ── Model Parameters ────────────────────────────────────
-    TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
-    TOP_P = float(os.getenv("TOP_P", "0.9"))
-    MAX_NEW_TOKENS = int(os.getenv("MAX_NEW_TOKENS", "1024"))
+    TEMPERATURE: float = _env("TEMPERATURE", "0.7", float)
+    TOP_P: float = _env("TOP_P", "0.9", float)
+    MAX_NEW_TOKENS: int = _env("MAX_NEW_TOKENS", "1024", int)
 
     # ── API Endpoint ─────────────────────────────────────────
-    HF_API_URL = "https://router.huggingface.co/v1/chat/completions"
+    HF_API_URL: str = "https://router.huggingface.co/v1/chat/completions"
+
+    # ── Webhook Delivery ─────────────────────────────────────
+    # Public HTTPS base URL Telegram pushes updates to. Empty = long-polling.
+    PUBLIC_URL: str = _env("PUBLIC_URL", "", lambda v: v.rstrip("/"))
+    # Sent back by Telegram in X-Telegram-Bot-Api-Secret-Token. Empty = derived from BOT_TOKEN,
+    # so every replica of the same bot agrees without extra setup.
+    WEBHOOK_SECRET: str = _env("WEBHOOK_SECRET", "")
+
+    # ── Update Dispatch ──────────────────────────────────────
+    # Max updates handled at once across all chats (turns within a chat stay ordered)
+    MAX_CONCURRENT_UPDATES: int = _env("MAX_CONCURRENT_UPDATES", "32", int)
+
+    # ── Telegram HTTP Pool ───────────────────────────────────
+    # Keep-alive sockets for send/edit calls; >1024 mostly just burns file descriptors
+    TG_POOL_SIZE: int = _env("TG_POOL_SIZE", "256", int)
+    TG_POOL_TIMEOUT: float = _env("TG_POOL_TIMEOUT", "20.0", float)
 
     # ── Bot Identity ─────────────────────────────────────────
-    BOT_VERSION = "2.1.0"
-    BOT_NAME = os.getenv("BOT_NAME", "AI Assistant")
-    BOT_DESCRIPTION = "Street-smart AI yang siap bantuin lu kapan aja 🤓"
+    BOT_VERSION: str = "2.1.0"
+    BOT_NAME: str = _env("BOT_NAME", "AI Assistant")
+    BOT_DESCRIPTION: str = "Street-smart AI yang siap bantuin lu kapan aja 🤓"
 
     # ── History & Context ────────────────────────────────────
-    MAX_HISTORY_MESSAGES = int(os.getenv("MAX_HISTORY_MESSAGES", "10"))
-    HISTORY_TTL_HOURS = int(os.getenv("HISTORY_TTL_HOURS", "24"))
+    MAX_HISTORY_MESSAGES: int = _env("MAX_HISTORY_MESSAGES", "10", int)
+    HISTORY_TTL_HOURS: int = _env("HISTORY_TTL_HOURS", "24", int)
 
     # ── Streaming Display ────────────────────────────────────
-    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "0.8"))
-    TYPING_CURSOR = "▌"
-
-    @classmethod
-    def validate(cls) -> list[str]:
+    STREAM_EDIT_INTERVAL: float = _env("STREAM_EDIT_INTERVAL", "0.8", float)
+    STREAM_MIN_DELTA: int = _env("STREAM_MIN_DELTA", "20", int)  # min new chars per edit
+    # Let identical prompts share one HF stream even when TEMPERATURE > 0
+    STREAM_SHARE: bool = _env("STREAM_SHARE", "false", lambda v: v.lower() in ("1", "true", "yes"))
+    TYPING_CURSOR: str = "▌"
+
+    def __post_init__(self):
+        object.__setattr__(self, "HF_MODEL_SHORT", self.HF_MODEL.rsplit("/", 1)[-1])
+        if not self.WEBHOOK_SECRET:
+            object.__setattr__(
+                self, "WEBHOOK_SECRET", hashlib.sha256(self.BOT_TOKEN.encode()).hexdigest()
+            )
+
+    def validate(self) -> list[str]:
         """Validate critical config values. Returns list of error messages."""
         errors = []
-        if not cls.BOT_TOKEN:
+        if not self.BOT_TOKEN:
             errors.append("❌ BOT_TOKEN is not set!")
-        if not cls.HF_TOKEN:
+        if not self.HF_TOKEN:
             errors.append("❌ HF_TOKEN is not set!")
-        if cls.TEMPERATURE < 0.0 or cls.TEMPERATURE > 2.0:
-            errors.append(f"⚠️ TEMPERATURE={cls.TEMPERATURE} is out of recommended range (0.0-2.0)")
-        if cls.TOP_P < 0.0 or cls.TOP_P > 1.0:
-            errors.append(f"⚠️ TOP_P={cls.TOP_P} is out of range (0.0-1.0)")
-        if cls.MAX_NEW_TOKENS < 1:
-            errors.append(f"⚠️ MAX_NEW_TOKENS={cls.MAX_NEW_TOKENS} must be >= 1")
-        if cls.RATE_LIMIT < 1:
-            errors.append(f"⚠️ RATE_LIMIT={cls.RATE_LIMIT} must be >= 1")
+        if self.TEMPERATURE < 0.0 or self.TEMPERATURE > 2.0:
+            errors.append(f"⚠️ TEMPERATURE={self.TEMPERATURE} is out of recommended range (0.0-2.0)")
+        if self.TOP_P < 0.0 or self.TOP_P > 1.0:
+            errors.append(f"⚠️ TOP_P={self.TOP_P} is out of range (0.0-1.0)")
+        if self.MAX_NEW_TOKENS < 1:
+            errors.append(f"⚠️ MAX_NEW_TOKENS={self.MAX_NEW_TOKENS} must be >= 1")
+        if self.STREAM_MIN_DELTA < 0:
+            errors.append(f"⚠️ STREAM_MIN_DELTA={self.STREAM_MIN_DELTA} must be >= 0")
+        if self.RATE_LIMIT < 1:
+            errors.append(f"⚠️ RATE_LIMIT={self.RATE_LIMIT} must be >= 1")
+        if self.MAX_CONCURRENT_UPDATES < 1:
+            errors.append(f"⚠️ MAX_CONCURRENT_UPDATES={self.MAX_CONCURRENT_UPDATES} must be >= 1")
+        if self.TG_POOL_SIZE < 1 or self.TG_POOL_SIZE > 1024:
+            errors.append(f"⚠️ TG_POOL_SIZE={self.TG_POOL_SIZE} is out of recommended range (1-1024)")
+        if self.PUBLIC_URL and not self.PUBLIC_URL.startswith("https://"):
+            errors.append(f"⚠️ PUBLIC_URL={self.PUBLIC_URL} should be https:// — Telegram rejects plain HTTP webhooks")
+        if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", self.WEBHOOK_SECRET):
+            errors.append("⚠️ WEBHOOK_SECRET must be 1-256 chars of A-Z, a-z, 0-9, _ or -")
         return errors
 
-    @classmethod
-    def summary(cls) -> str:
+    def summary(self) -> str:
         """Return a human-readable config summary for boot logs."""
-        admin_count = len(cls.ADMIN_IDS)
-        model_short = cls.HF_MODEL.split("/")[-1] if "/" in cls.HF_MODEL else cls.HF_MODEL
-        return (
-            f"\n"
-            f"╔══════════════════════════════════════════════╗\n"
-            f"║        🤖 {cls.BOT_NAME} v{cls.BOT_VERSION}            ║\n"
-            f"╠══════════════════════════════════════════════╣\n"
-            f"║ Model      : {model_short:<30} ║\n"
-            f"║ Temp       : {cls.TEMPERATURE:<30} ║\n"
-            f"║ Top-P      : {cls.TOP_P:<30} ║\n"
-            f"║ Max Tokens : {cls.MAX_NEW_TOKENS:<30} ║\n"
-            f"║ Rate Limit : {cls.RATE_LIMIT}/min{' ' * 24}║\n"
-            f"║ Max Input  : {cls.MAX_INPUT_CHARS} chars{' ' * 20}║\n"
-            f"║ History    : {cls.MAX_HISTORY_MESSAGES} msgs / {cls.HISTORY_TTL_HOURS}h TTL{' ' * 14}║\n"
-            f"║ Admins     : {admin_count} registered{' ' * 18}║\n"
-            f"╚══════════════════════════════════════════════╝"
-        )
+        return _SUMMARY_TMPL.format_map({
+            "bot_name": self.BOT_NAME,
+            "bot_version": self.BOT_VERSION,
+            "model": self.HF_MODEL_SHORT,
+            "temperature": self.TEMPERATURE,
+            "top_p": self.TOP_P,
+            "max_tokens": self.MAX_NEW_TOKENS,
+            "rate_limit": self.RATE_LIMIT,
+            "max_input": self.MAX_INPUT_CHARS,
+            "history": self.MAX_HISTORY_MESSAGES,
+            "ttl": self.HISTORY_TTL_HOURS,
+            "admins": len(self.ADMIN_IDS),
+        })
+
+
+_SUMMARY_TMPL = (
+    "\n"
+    "╔══════════════════════════════════════════════╗\n"
+    "║        🤖 {bot_name} v{bot_version}            ║\n"
+    "╠══════════════════════════════════════════════╣\n"
+    "║ Model      : {model:<30} ║\n"
+    "║ Temp       : {temperature:<30} ║\n"
+    "║ Top-P      : {top_p:<30} ║\n"
+    "║ Max Tokens : {max_tokens:<30} ║\n"
+    "║ Rate Limit : {rate_limit}/min                        ║\n"
+    "║ Max Input  : {max_input} chars                    ║\n"
+    "║ History    : {history} msgs / {ttl}h TTL              ║\n"
+    "║ Admins     : {admins} registered                  ║\n"
+    "╚══════════════════════════════════════════════╝"
+)
+
+
+# Single immutable instance, parsed once; attribute reads are slot lookups
+Config = _Config()
 
 
 # ╔══════════════════════════════════════════════════════════╗
@@ -92,21 +163,35 @@ class Config:
 
 class TokenFilter(logging.Filter):
     """Mask sensitive tokens in log output."""
-    SENSITIVE_KEYS = []
 
     def __init__(self):
         super().__init__()
-        if Config.BOT_TOKEN:
-            self.SENSITIVE_KEYS.append((Config.BOT_TOKEN, "***BOT_TOKEN***"))
-        if Config.HF_TOKEN:
-            self.SENSITIVE_KEYS.append((Config.HF_TOKEN, "***HF_TOKEN***"))
+        # Per-instance: a shared class list kept growing on every setup_logging()
+        self.SENSITIVE_KEYS = tuple(
+            (token, mask)
+            for token, mask in (
+                (Config.BOT_TOKEN, "***BOT_TOKEN***"),
+                (Config.HF_TOKEN, "***HF_TOKEN***"),
+                (Config.WEBHOOK_SECRET, "***WEBHOOK_SECRET***"),
+            )
+            if token
+        )
+
+        # One compiled alternation = single C-level scan per record
+        self._table = dict(self.SENSITIVE_KEYS)
+        self._pattern = (
+            re.compile("|".join(re.escape(token) for token in self._table))
+            if self._table else None
+        )
 
     def filter(self, record):
+        if self._pattern is None:
+            return True
         message = record.getMessage()
-        for token, mask in self.SENSITIVE_KEYS:
-            if token in message:
-                record.msg = message.replace(token, mask)
-                record.args = None  # Prevent re-formatting with args
+        masked, hits = self._pattern.subn(lambda m: self._table[m.group(0)], message)
+        if hits:
+            record.msg = masked
+            record.args = None  # Prevent re-formatting with args
         return True
 
 
@@ -121,19 +206,51 @@ class ColorFormatter(logging.Formatter):
     }
     RESET = "\033[0m"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Pipes (Docker, journald, Railway) get plain text — see https://no-color.org
+        self._use_color = sys.stdout.isatty() and os.getenv("NO_COLOR") is None
+        self._colored_names: dict[int, str] = {}
+
     def format(self, record):
-        color = self.COLORS.get(record.levelno, self.RESET)
-        record.levelname = f"{color}{record.levelname}{self.RESET}"
-        return super().format(record)
+        if not self._use_color:
+            return super().format(record)
+
+        colored = self._colored_names.get(record.levelno)
+        if colored is None:
+            color = self.COLORS.get(record.levelno, self.RESET)
+            colored = self._colored_names[record.levelno] = f"{color}{record.levelname}{self.RESET}"
+
+        # Restore afterwards so the file handler doesn't inherit escape codes
+        levelname = record.levelname
+        record.levelname = colored
+        try:
+            return super().format(record)
+        finally:
+            record.levelname = levelname
+
+
+_log_listener: QueueListener | None = None
+
+
+@atexit.register
+def _stop_log_listener():
+    """Flush and stop whichever listener is current; safe to call repeatedly."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
 
 
 def setup_logging():
+    global _log_listener
     logger = logging.getLogger()
     logger.setLevel(logging.INFO)
 
     # Avoid duplicate handlers on reload
     if logger.handlers:
         logger.handlers.clear()
+    _stop_log_listener()
 
     token_filter = TokenFilter()
 
@@ -147,8 +264,7 @@ def setup_logging():
     ch.addFilter(token_filter)
 
     # ── File Handler (structured) ────────────────────────────
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
+    Path("logs").mkdir(parents=True, exist_ok=True)
 
     file_fmt = logging.Formatter(
         '%(asctime)s | %(name)s | %(levelname)s | %(funcName)s:%(lineno)d | %(message)s',
@@ -163,8 +279,12 @@ def setup_logging():
     fh.setFormatter(file_fmt)
     fh.addFilter(token_filter)
 
-    logger.addHandler(ch)
-    logger.addHandler(fh)
+    # ── Queue Handler (I/O off the event loop) ───────────────
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+
+    _log_listener = QueueListener(log_queue, ch, fh, respect_handler_level=True)
+    _log_listener.start()
 
     # ── Silence noisy third-party loggers ────────────────────
     for noisy in ("httpx", "httpcore", "hpack", "h2", "urllib3"):
@@ -172,16 +292,31 @@ def setup_logging():
     logging.getLogger("telegram").setLevel(logging.INFO)
 
 
-# ── Initialize on import ────────────────────────────────────
-setup_logging()
 logger = logging.getLogger(__name__)
+_configured = False
+
+
+def configure():
+    """
+    Set up logging, validate config and print the summary banner.
+
+    Called once from the entrypoint instead of at import time, so importing
+    Config stays cheap for tests, tools and worker processes. Idempotent.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    setup_logging()
 
-# Validate config on startup
-_config_errors = Config.validate()
-if _config_errors:
-    for err in _config_errors:
-        logger.error(err)
-    if any("❌" in e for e in _config_errors):
-        logger.critical("Critical configuration missing. Bot may not function properly!")
+    # Validate config on startup
+    config_errors = Config.validate()
+    if config_errors:
+        for err in config_errors:
+            logger.error(err)
+        if any("❌" in e for e in config_errors):
+            logger.critical("Critical configuration missing. Bot may not function properly!")
 
-logger.info(Config.summary())
\ No newline at end of file
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(Config.summary())
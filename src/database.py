@@ -1,36 +1,118 @@
 # src/database.py
 import os
+import asyncio
 import aiosqlite
 import logging
-from datetime import datetime, timezone, timedelta
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 
 logger = logging.getLogger(__name__)
 DB_FILE = os.getenv("DB_FILE", "bot_memory.db")
 
+# ╔══════════════════════════════════════════════════════════╗
+# ║              🔌 SHARED CONNECTION                        ║
+# ╚══════════════════════════════════════════════════════════╝
+
+# Applied once per connection: WAL lets reads run during writes, NORMAL skips
+# the per-commit fsync that WAL makes unnecessary for durability of the DB file
+_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA mmap_size=268435456",  # 256 MB: reads go via the OS page cache, no pager memcpy
+)
+
+# Refresh sqlite_stat1 periodically so the planner keeps picking the right index
+OPTIMIZE_INTERVAL = 4 * 3600
+
+# Group commit: add_message() rows are flushed together, up to N rows or T ms
+BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "64"))
+BATCH_WAIT = int(os.getenv("DB_BATCH_WAIT_MS", "50")) / 1000
+# Bounded queue: when the disk falls behind, writers wait instead of piling up
+QUEUE_MAX = int(os.getenv("DB_QUEUE_MAX", "1024"))
+
+_db: aiosqlite.Connection | None = None
+_db_lock = asyncio.Lock()
+# One shared connection = one transaction at a time; every write sequence takes this
+_write_lock = asyncio.Lock()
+_optimize_task: asyncio.Task | None = None
+_pending: asyncio.Queue | None = None
+_flusher_task: asyncio.Task | None = None
+
+
+async def get_db() -> aiosqlite.Connection:
+    """Return the shared connection, opening and tuning it on first use."""
+    global _db
+    if _db is None:
+        async with _db_lock:
+            if _db is None:
+                db = await aiosqlite.connect(DB_FILE)
+                for pragma in _PRAGMAS:
+                    await db.execute(pragma)
+                _db = db
+                logger.debug(f"🔌 Opened shared DB connection to {DB_FILE}")
+    return _db
+
+
+async def _optimize_loop():
+    """Background loop: run PRAGMA optimize every OPTIMIZE_INTERVAL seconds."""
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL)
+        try:
+            db = await get_db()
+            # Never inside someone else's open write transaction
+            async with _write_lock:
+                await db.execute("PRAGMA optimize")
+            logger.debug("📈 PRAGMA optimize done")
+        except Exception as e:
+            logger.warning(f"⚠️ Periodic PRAGMA optimize failed: {e}")
+
+
+async def close_db():
+    """Refresh planner stats and close the shared connection (call on shutdown)."""
+    global _db, _optimize_task, _pending, _flusher_task
+    if _optimize_task is not None:
+        _optimize_task.cancel()
+        _optimize_task = None
+    if _flusher_task is not None:
+        # Sentinel lets the flusher write whatever is still queued, then exit
+        await _pending.put(None)
+        await _flusher_task
+        _pending = _flusher_task = None
+    if _db is None:
+        return
+    db, _db = _db, None
+    try:
+        await db.execute("PRAGMA optimize")
+    finally:
+        await db.close()
+    logger.info("💾 Database connection closed")
+
+
 # ╔══════════════════════════════════════════════════════════╗
 # ║              💾 DATABASE INITIALIZATION                  ║
 # ╚══════════════════════════════════════════════════════════╝
 
 async def _get_existing_columns(db: aiosqlite.Connection, table: str) -> set[str]:
     """Get set of existing column names for a table."""
-    columns = set()
     try:
         async with db.execute(f"PRAGMA table_info({table})") as cursor:
-            rows = await cursor.fetchall()
-            for row in rows:
-                columns.add(row[1])
+            return {row[1] async for row in cursor}
     except Exception as e:
         logger.warning(f"⚠️ Could not read columns for {table}: {e}")
-    return columns
+        return set()
 
 
-async def _migrate_tables(db: aiosqlite.Connection):
+async def _migrate_tables(db: aiosqlite.Connection) -> dict[str, set[str]]:
     """
     Safely add new columns to existing tables.
     
     SQLite restriction: ALTER TABLE ADD COLUMN cannot use non-constant defaults
     like CURRENT_TIMESTAMP. So we use constant defaults ('', 0) during ALTER,
     then backfill with actual values.
+
+    Returns the resulting column set per table.
     """
 
     # ── Column additions (constant defaults only!) ───────────
@@ -45,11 +127,14 @@ async def _migrate_tables(db: aiosqlite.Connection):
 
     migrated_columns = []
 
+    # One PRAGMA table_info per table, kept current as columns are added
+    columns = {table: await _get_existing_columns(db, table) for table in ("chat_history", "user_stats")}
+
     for table, column, col_type in migrations:
-        existing = await _get_existing_columns(db, table)
-        if column not in existing:
+        if column not in columns[table]:
             try:
                 await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+                columns[table].add(column)
                 migrated_columns.append(f"{table}.{column}")
                 logger.info(f"📦 Migration: Added {table}.{column}")
             except Exception as e:
@@ -74,60 +159,86 @@ async def _migrate_tables(db: aiosqlite.Connection):
     if migrated_columns:
         logger.info(f"📦 Migration complete: {len(migrated_columns)} columns added")
 
+    return columns
+
 
-async def _has_column(db: aiosqlite.Connection, table: str, column: str) -> bool:
-    """Quick check if a specific column exists in a table."""
-    columns = await _get_existing_columns(db, table)
-    return column in columns
+# Column sets per table, filled once by init_db() after migrations (schema is fixed after)
+_SCHEMA: dict[str, frozenset[str]] = {}
+
+
+def _has_column(table: str, column: str) -> bool:
+    """Quick check if a specific column exists in a table (cached schema)."""
+    return column in _SCHEMA.get(table, frozenset())
+
+
+# One executescript() per phase instead of an execute() round-trip per statement
+_DDL_TABLES = """
+    BEGIN;
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INTEGER PRIMARY KEY,
+        message_count INTEGER DEFAULT 0
+    );
+    COMMIT;
+"""
+
+# Indexes run after migrations, since some cover migrated columns
+_DDL_INDEXES = """
+    -- cleanup_old_history() range-deletes on timestamp
+    CREATE INDEX IF NOT EXISTS idx_chat_timestamp ON chat_history(timestamp);
+    -- Covering: get_history() is answered from the index without touching the table;
+    -- its user_id prefix also serves every other WHERE user_id = ? lookup
+    CREATE INDEX IF NOT EXISTS idx_chat_user_time_cov
+        ON chat_history(user_id, id DESC, role, content);
+    -- Superseded by idx_chat_user_time_cov
+    DROP INDEX IF EXISTS idx_chat_user_time;
+    DROP INDEX IF EXISTS idx_chat_user_id;
+"""
+_DDL_LAST_ACTIVE_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_user_last_active ON user_stats(last_active);
+"""
 
 
 async def init_db():
     """Initialize database with all required tables and indexes."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        # ── Chat history table ───────────────────────────────
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS chat_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        # ── User stats table (base) ─────────────────────────
-        await db.execute("""
-            CREATE TABLE IF NOT EXISTS user_stats (
-                user_id INTEGER PRIMARY KEY,
-                message_count INTEGER DEFAULT 0
-            )
-        """)
-
-        # ── Run migrations ───────────────────────────────────
-        await _migrate_tables(db)
-
-        # ── Performance indexes ──────────────────────────────
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_chat_user_id 
-            ON chat_history(user_id)
-        """)
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_chat_timestamp 
-            ON chat_history(timestamp)
-        """)
-        await db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_chat_user_time 
-            ON chat_history(user_id, id DESC)
-        """)
-
-        await db.commit()
+    global _optimize_task, _pending, _flusher_task
+    db = await get_db()
+    # ── Tables (base schema) ─────────────────────────────────
+    await db.executescript(_DDL_TABLES)
+
+    # ── Run migrations ───────────────────────────────────────
+    columns = await _migrate_tables(db)
+
+    for table, cols in columns.items():
+        _SCHEMA[table] = frozenset(cols)
+    _specialize_sql()
+
+    # ── Performance indexes ──────────────────────────────────
+    script = _DDL_INDEXES
+    if _has_column("user_stats", "last_active"):
+        script += _DDL_LAST_ACTIVE_INDEX
+    await db.executescript(f"BEGIN;\n{script}COMMIT;")
+
+    # ── Planner statistics ───────────────────────────────────
+    # 0x10002: analyze every table now, with a row limit so big DBs stay fast
+    await db.execute("PRAGMA optimize=0x10002")
+    if _optimize_task is None:
+        _optimize_task = asyncio.create_task(_optimize_loop())
+    if _flusher_task is None:
+        _pending = asyncio.Queue(maxsize=QUEUE_MAX)
+        _flusher_task = asyncio.create_task(_flush_loop())
 
     # ── Log database info ────────────────────────────────────
-    info = await get_db_info()
+    # Counts are skipped here: they scan whole tables while the cache is cold
+    info = await get_db_info(include_counts=False)
     logger.info(
         f"💾 Database initialized | "
-        f"Users: {info['total_users']} | "
-        f"Messages: {info['total_messages']} | "
         f"Size: {info['db_size']} | "
         f"File: {DB_FILE}"
     )
@@ -137,100 +248,242 @@ async def init_db():
 # ║              💬 CHAT HISTORY OPERATIONS                  ║
 # ╚══════════════════════════════════════════════════════════╝
 
-async def add_message(user_id: int, role: str, content: str):
-    """Store a message and update user stats atomically."""
-    char_count = len(content)
-    now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-
-    async with aiosqlite.connect(DB_FILE) as db:
-        # ── Check which columns exist ────────────────────────
-        has_char_count = await _has_column(db, "chat_history", "char_count")
-        has_last_active = await _has_column(db, "user_stats", "last_active")
-        has_total_chars = await _has_column(db, "user_stats", "total_chars_sent")
-        has_first_seen = await _has_column(db, "user_stats", "first_seen")
-
-        # ── Insert chat message ──────────────────────────────
-        if has_char_count:
-            await db.execute(
-                "INSERT INTO chat_history (user_id, role, content, char_count) VALUES (?, ?, ?, ?)",
-                (user_id, role, content, char_count),
-            )
-        else:
-            await db.execute(
-                "INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)",
-                (user_id, role, content),
-            )
+# ── Per-schema SQL, picked once by init_db() ─────────────────
+# Defaults match the base (pre-migration) schema until _specialize_sql() runs
+_SQL_INSERT_CHAT = "INSERT INTO chat_history (user_id, role, content) VALUES (?, ?, ?)"
+_SQL_UPSERT_USER = """
+    INSERT INTO user_stats (user_id, message_count)
+    VALUES (?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET message_count = message_count + 1
+"""
+_SQL_USER_STATS = "SELECT message_count FROM user_stats WHERE user_id = ?"
+_USER_STATS_KEYS = ("total_messages",)
 
-        # ── Update user stats (only for user messages) ──────
-        if role == "user":
-            if has_last_active and has_total_chars and has_first_seen:
-                await db.execute(
-                    """
-                    INSERT INTO user_stats (user_id, message_count, first_seen, last_active, total_chars_sent)
-                    VALUES (?, 1, ?, ?, ?)
-                    ON CONFLICT(user_id) DO UPDATE SET
-                        message_count = message_count + 1,
-                        last_active = ?,
-                        total_chars_sent = total_chars_sent + ?
-                    """,
-                    (user_id, now_str, now_str, char_count, now_str, char_count),
-                )
-            else:
-                await db.execute(
-                    """
-                    INSERT INTO user_stats (user_id, message_count) 
-                    VALUES (?, 1)
-                    ON CONFLICT(user_id) DO UPDATE SET message_count = message_count + 1
-                    """,
-                    (user_id,),
-                )
 
+def _rows_base(user_id: int, role: str, content: str) -> tuple[tuple, tuple | None]:
+    return (user_id, role, content), ((user_id,) if role == "user" else None)
+
+
+def _rows_full(user_id: int, role: str, content: str) -> tuple[tuple, tuple | None]:
+    chars = len(content)
+    return (user_id, role, content, chars), ((user_id, chars) if role == "user" else None)
+
+
+# (chat_row, user_row) builder matching the chosen SQL pair
+_build_rows = _rows_base
+
+
+def _specialize_sql():
+    """Freeze the add_message() / get_user_stats() statements for the migrated schema."""
+    global _SQL_INSERT_CHAT, _SQL_UPSERT_USER, _build_rows
+    global _SQL_USER_STATS, _USER_STATS_KEYS
+
+    # The INSERT/UPSERT pair and its row builder switch together, all or nothing
+    if _has_column("chat_history", "char_count") and all(
+        _has_column("user_stats", c) for c in ("first_seen", "last_active", "total_chars_sent")
+    ):
+        _SQL_INSERT_CHAT = (
+            "INSERT INTO chat_history (user_id, role, content, char_count) VALUES (?, ?, ?, ?)"
+        )
+        _SQL_UPSERT_USER = """
+            INSERT INTO user_stats (user_id, message_count, first_seen, last_active, total_chars_sent)
+            VALUES (?, 1, datetime('now'), datetime('now'), ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                message_count = message_count + 1,
+                last_active = excluded.last_active,
+                total_chars_sent = total_chars_sent + excluded.total_chars_sent
+        """
+        _build_rows = _rows_full
+
+    # One fixed SQL string per process, so sqlite3's statement cache always hits
+    optional = [
+        col for col in ("first_seen", "last_active", "total_chars_sent", "reset_count")
+        if _has_column("user_stats", col)
+    ]
+    _SQL_USER_STATS = f"SELECT {', '.join(['message_count', *optional])} FROM user_stats WHERE user_id = ?"
+    _USER_STATS_KEYS = ("total_messages", *optional)
+
+
+@asynccontextmanager
+async def _transaction():
+    """
+    BEGIN IMMEDIATE … COMMIT under _write_lock, ROLLBACK on any error.
+
+    The connection is shared, so an unserialized commit()/rollback() would
+    also commit or discard whatever another coroutine had half-written.
+    """
+    db = await get_db()
+    async with _write_lock:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            await db.rollback()
+            raise
         await db.commit()
 
 
+async def _write_row(db: aiosqlite.Connection, chat_row: tuple, user_row: tuple | None):
+    await db.execute(_SQL_INSERT_CHAT, chat_row)
+    if user_row is not None:
+        await db.execute(_SQL_UPSERT_USER, user_row)
+
+
+def _settle(waiter: asyncio.Future, error: BaseException | None = None):
+    if waiter.done():
+        return
+    if error is None:
+        waiter.set_result(None)
+    else:
+        waiter.set_exception(error)
+
+
+async def _write_batch(batch: list[tuple]):
+    """Commit queued rows in one transaction; fall back to row-by-row on failure."""
+    try:
+        async with _transaction() as db:
+            await db.executemany(_SQL_INSERT_CHAT, [chat_row for chat_row, _, _ in batch])
+            user_rows = [user_row for _, user_row, _ in batch if user_row is not None]
+            if user_rows:
+                await db.executemany(_SQL_UPSERT_USER, user_rows)
+    except Exception as e:
+        logger.warning(f"⚠️ Batch insert of {len(batch)} rows failed, retrying per row: {e}")
+        for chat_row, user_row, waiter in batch:
+            try:
+                async with _transaction() as db:
+                    await _write_row(db, chat_row, user_row)
+            except Exception as row_err:
+                _settle(waiter, row_err)
+            else:
+                _settle(waiter)
+        return
+
+    for _, _, waiter in batch:
+        _settle(waiter)
+
+
+async def _flush_loop():
+    """Background task: drain the add_message() queue in BATCH_SIZE / BATCH_WAIT groups."""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await _pending.get()
+        if item is None:
+            return
+
+        batch = [item]
+        deadline = loop.time() + BATCH_WAIT
+        stopping = False
+        while len(batch) < BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_pending.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                stopping = True
+                break
+            batch.append(item)
+
+        # Whatever goes wrong, fail this batch's waiters and keep the flusher alive
+        try:
+            await _write_batch(batch)
+        except Exception as e:
+            logger.error(f"❌ DB flush of {len(batch)} rows failed: {e}")
+            for _, _, waiter in batch:
+                _settle(waiter, e)
+        if stopping:
+            return
+
+
+async def add_message(user_id: int, role: str, content: str):
+    """
+    Store a message and update user stats.
+
+    Rows are group-committed by the background flusher; this returns once
+    the row is durable, so a following get_history() sees it.
+    """
+    await add_messages_batch(user_id, [(role, content)])
+
+
+async def add_messages_batch(user_id: int, messages: list[tuple[str, str]]):
+    """
+    Store several (role, content) messages for one user.
+
+    The rows are queued back to back, so the flusher normally writes them in
+    one transaction (BATCH_SIZE or a full queue can split them).
+    """
+    rows = [_build_rows(user_id, role, content) for role, content in messages]
+
+    # ── No flusher (init_db not run yet): write directly ─────
+    if _pending is None:
+        async with _transaction() as db:
+            for chat_row, user_row in rows:
+                await _write_row(db, chat_row, user_row)
+        return
+
+    loop = asyncio.get_running_loop()
+    waiters = []
+    for chat_row, user_row in rows:
+        waiter = loop.create_future()
+        await _pending.put((chat_row, user_row, waiter))
+        waiters.append(waiter)
+    await asyncio.gather(*waiters)
+
+
 async def get_history(user_id: int, limit: int = 10) -> list:
     """Fetch recent conversation history in chronological order."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        async with db.execute(
-            "SELECT role, content FROM chat_history WHERE user_id = ? ORDER BY id DESC LIMIT ?",
-            (user_id, limit),
-        ) as cursor:
-            rows = await cursor.fetchall()
-            return [{"role": row[0], "content": row[1]} for row in reversed(rows)]
+    db = await get_db()
+    # Newest N via the index, flipped back to chronological order inside SQLite
+    async with db.execute(
+        """
+        SELECT role, content FROM (
+            SELECT id, role, content FROM chat_history
+            WHERE user_id = ? ORDER BY id DESC LIMIT ?
+        ) ORDER BY id ASC
+        """,
+        (user_id, limit),
+    ) as cursor:
+        return [{"role": role, "content": content} for role, content in await cursor.fetchall()]
+
+
+async def get_user_role_counts(user_id: int, limit: int = 10) -> dict[str, int]:
+    """Count messages per role within the user's last `limit` turns (the context window)."""
+    db = await get_db()
+    async with db.execute(
+        """
+        SELECT role, COUNT(*) FROM (
+            SELECT role FROM chat_history
+            WHERE user_id = ? ORDER BY id DESC LIMIT ?
+        ) GROUP BY role
+        """,
+        (user_id, limit),
+    ) as cursor:
+        return {role: count async for role, count in cursor}
 
 
 async def clear_history(user_id: int):
     """Clear all chat history for a user and increment reset counter if column exists."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        # ── Count messages being deleted ─────────────────────
+    async with _transaction() as db:
+        # ── Delete history (rowcount = sqlite3_changes) ──────
         async with db.execute(
-            "SELECT COUNT(*) FROM chat_history WHERE user_id = ?", (user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            deleted_count = row[0] if row else 0
-
-        # ── Delete history ───────────────────────────────────
-        await db.execute(
             "DELETE FROM chat_history WHERE user_id = ?", (user_id,)
-        )
-
-        # ── Increment reset counter (safe) ───────────────────
-        has_reset = await _has_column(db, "user_stats", "reset_count")
-        has_active = await _has_column(db, "user_stats", "last_active")
-        now_str = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
-
-        if has_reset and has_active:
-            await db.execute(
-                "UPDATE user_stats SET reset_count = reset_count + 1, last_active = ? WHERE user_id = ?",
-                (now_str, user_id),
-            )
-        elif has_reset:
-            await db.execute(
-                "UPDATE user_stats SET reset_count = reset_count + 1 WHERE user_id = ?",
-                (user_id,),
-            )
+        ) as cursor:
+            deleted_count = cursor.rowcount
 
-        await db.commit()
+        # ── Increment reset counter (same transaction) ───────
+        if _has_column("user_stats", "reset_count"):
+            if _has_column("user_stats", "last_active"):
+                await db.execute(
+                    "UPDATE user_stats SET reset_count = reset_count + 1, last_active = datetime('now') WHERE user_id = ?",
+                    (user_id,),
+                )
+            else:
+                await db.execute(
+                    "UPDATE user_stats SET reset_count = reset_count + 1 WHERE user_id = ?",
+                    (user_id,),
+                )
 
     if deleted_count > 0:
         logger.info(f"🧹 Cleared {deleted_count} messages for user {user_id}")
@@ -238,22 +491,17 @@ async def clear_history(user_id: int):
 
 async def cleanup_old_history(ttl_hours: int = 24):
     """Remove chat history older than TTL."""
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=ttl_hours)
-    cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
+    # Cutoff computed by SQLite, same UTC format as CURRENT_TIMESTAMP
+    cutoff = f"-{int(ttl_hours)} hours"
 
-    async with aiosqlite.connect(DB_FILE) as db:
+    async with _transaction() as db:
         async with db.execute(
-            "SELECT COUNT(*) FROM chat_history WHERE timestamp < ?", (cutoff_str,)
+            "DELETE FROM chat_history WHERE timestamp < datetime('now', ?)", (cutoff,)
         ) as cursor:
-            row = await cursor.fetchone()
-            count = row[0] if row else 0
+            count = cursor.rowcount
 
-        if count > 0:
-            await db.execute(
-                "DELETE FROM chat_history WHERE timestamp < ?", (cutoff_str,)
-            )
-            await db.commit()
-            logger.info(f"🧹 Cleanup: Removed {count} messages older than {ttl_hours}h")
+    if count > 0:
+        logger.info(f"🧹 Cleanup: Removed {count} messages older than {ttl_hours}h")
 
     return count
 
@@ -264,45 +512,39 @@ async def cleanup_old_history(ttl_hours: int = 24):
 
 async def get_global_stats() -> dict:
     """Get comprehensive global bot statistics."""
-    async with aiosqlite.connect(DB_FILE) as db:
-        # ── Basic counts ─────────────────────────────────────
-        async with db.execute(
-            "SELECT COUNT(*), COALESCE(SUM(message_count), 0) FROM user_stats"
-        ) as cursor:
-            row = await cursor.fetchone()
-            total_users = row[0] or 0
-            total_messages = row[1] or 0
-
-        # ── Active today ─────────────────────────────────────
-        active_today = 0
-        if await _has_column(db, "user_stats", "last_active"):
-            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
-            async with db.execute(
-                "SELECT COUNT(*) FROM user_stats WHERE DATE(last_active) = ?",
-                (today,),
-            ) as cursor:
-                row = await cursor.fetchone()
-                active_today = row[0] or 0
-
-        # ── Total chat entries ───────────────────────────────
-        async with db.execute("SELECT COUNT(*) FROM chat_history") as cursor:
-            row = await cursor.fetchone()
-            total_history_entries = row[0] or 0
-
-        # ── Total characters ─────────────────────────────────
-        total_chars = 0
-        if await _has_column(db, "user_stats", "total_chars_sent"):
-            async with db.execute(
-                "SELECT COALESCE(SUM(total_chars_sent), 0) FROM user_stats"
-            ) as cursor:
-                row = await cursor.fetchone()
-                total_chars = row[0] or 0
+    db = await get_db()
+    # ── All scalar counters in one round-trip ────────────────
+    # user_stats sums share one scan; active-today keeps its index via the subquery
+    chars_expr = (
+        "COALESCE(SUM(total_chars_sent), 0)"
+        if _has_column("user_stats", "total_chars_sent") else "0"
+    )
+    # Half-open range on the raw column keeps idx_user_last_active usable (DATE() would not)
+    active_expr = (
+        "(SELECT COUNT(*) FROM user_stats"
+        " WHERE last_active >= date('now') AND last_active < date('now', '+1 day'))"
+        if _has_column("user_stats", "last_active") else "0"
+    )
+    async with db.execute(
+        f"""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(message_count), 0),
+            {chars_expr},
+            {active_expr},
+            (SELECT COUNT(*) FROM chat_history)
+        FROM user_stats
+        """
+    ) as cursor:
+        total_users, total_messages, total_chars, active_today, total_history_entries = (
+            await cursor.fetchone()
+        )
 
-        # ── Top users ────────────────────────────────────────
-        async with db.execute(
-            "SELECT user_id, message_count FROM user_stats ORDER BY message_count DESC LIMIT 5"
-        ) as cursor:
-            top_users = await cursor.fetchall()
+    # ── Top users ────────────────────────────────────────────
+    async with db.execute(
+        "SELECT user_id, message_count FROM user_stats ORDER BY message_count DESC LIMIT 5"
+    ) as cursor:
+        top_users = await cursor.fetchall()
 
     return {
         "total_users": total_users,
@@ -324,64 +566,56 @@ async def get_user_stats(user_id: int) -> dict:
         "reset_count": 0,
     }
 
-    async with aiosqlite.connect(DB_FILE) as db:
-        existing = await _get_existing_columns(db, "user_stats")
+    db = await get_db()
+    async with db.execute(_SQL_USER_STATS, (user_id,)) as cursor:
+        row = await cursor.fetchone()
 
-        # ── Build SELECT dynamically ─────────────────────────
-        select_cols = ["message_count"]
-        col_keys = ["total_messages"]
+        if not row:
+            return default
 
-        for col, key in [
-            ("first_seen", "first_seen"),
-            ("last_active", "last_active"),
-            ("total_chars_sent", "total_chars_sent"),
-            ("reset_count", "reset_count"),
-        ]:
-            if col in existing:
-                select_cols.append(col)
-                col_keys.append(key)
-
-        query = f"SELECT {', '.join(select_cols)} FROM user_stats WHERE user_id = ?"
+        result = dict(default)
+        for key, value in zip(_USER_STATS_KEYS, row):
+            if value is None or value == '':
+                result[key] = default[key]
+            else:
+                result[key] = value
 
-        async with db.execute(query, (user_id,)) as cursor:
-            row = await cursor.fetchone()
+        return result
 
-            if not row:
-                return default
 
-            result = dict(default)
-            for i, key in enumerate(col_keys):
-                value = row[i]
-                if value is None or value == '':
-                    result[key] = default[key]
-                else:
-                    result[key] = value
+_SIZE_UNITS = (("B", 0), ("KB", 1), ("MB", 2), ("GB", 2))
 
-            return result
 
+async def get_db_info(include_counts: bool = True) -> dict:
+    """
+    Get database file info and summary stats.
 
-async def get_db_info() -> dict:
-    """Get database file info and summary stats."""
-    try:
-        size_bytes = os.path.getsize(DB_FILE)
-        if size_bytes < 1024:
-            db_size = f"{size_bytes} B"
-        elif size_bytes < 1024 * 1024:
-            db_size = f"{size_bytes / 1024:.1f} KB"
-        else:
-            db_size = f"{size_bytes / (1024 * 1024):.2f} MB"
-    except OSError:
-        db_size = "N/A"
+    Size comes from page_count * page_size on the open connection (includes
+    pages still in the WAL). Pass include_counts=False to skip the COUNT(*)
+    scans — counts are then reported as 0.
+    """
+    total_users = 0
+    total_messages = 0
+    db_size = "N/A"
 
     try:
-        async with aiosqlite.connect(DB_FILE) as db:
-            async with db.execute("SELECT COUNT(*) FROM user_stats") as c:
-                total_users = (await c.fetchone())[0] or 0
-            async with db.execute("SELECT COUNT(*) FROM chat_history") as c:
-                total_messages = (await c.fetchone())[0] or 0
-    except Exception:
-        total_users = 0
-        total_messages = 0
+        db = await get_db()
+        async with db.execute(
+            "SELECT (SELECT page_count FROM pragma_page_count()) * (SELECT page_size FROM pragma_page_size())"
+        ) as c:
+            size_bytes = (await c.fetchone())[0] or 0
+        # bit_length picks the 1024-power directly: 10 bits per unit step
+        unit = min((size_bytes.bit_length() - 1) // 10, 3) if size_bytes > 0 else 0
+        suffix, digits = _SIZE_UNITS[unit]
+        db_size = f"{size_bytes / (1 << 10 * unit):.{digits}f} {suffix}"
+
+        if include_counts:
+            async with db.execute(
+                "SELECT (SELECT COUNT(*) FROM user_stats), (SELECT COUNT(*) FROM chat_history)"
+            ) as c:
+                total_users, total_messages = await c.fetchone()
+    except Exception as e:
+        logger.warning(f"⚠️ Could not read DB info: {e}")
 
     return {
         "db_file": DB_FILE,
@@ -397,7 +631,9 @@ async def get_db_info() -> dict:
 
 async def vacuum_db():
     """Reclaim unused space in the database file."""
-    async with aiosqlite.connect(DB_FILE) as db:
+    db = await get_db()
+    # VACUUM fails inside a transaction, so wait out any in-flight write
+    async with _write_lock:
         await db.execute("VACUUM")
     logger.info("🗜️ Database vacuumed successfully")
 
@@ -405,11 +641,11 @@ async def vacuum_db():
 async def get_table_sizes() -> dict:
     """Get row counts for all tables."""
     tables = {}
-    async with aiosqlite.connect(DB_FILE) as db:
-        for table in ("chat_history", "user_stats"):
-            try:
-                async with db.execute(f"SELECT COUNT(*) FROM {table}") as c:
-                    tables[table] = (await c.fetchone())[0] or 0
-            except Exception:
-                tables[table] = -1
+    db = await get_db()
+    for table in ("chat_history", "user_stats"):
+        try:
+            async with db.execute(f"SELECT COUNT(*) FROM {table}") as c:
+                tables[table] = (await c.fetchone())[0] or 0
+        except Exception:
+            tables[table] = -1
     return tables
\ No newline at end of file
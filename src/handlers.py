@@ -2,6 +2,7 @@
 import time
 import asyncio
 import logging
+import weakref
 from datetime import datetime, timezone
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ChatAction, ParseMode
@@ -9,10 +10,19 @@ from telegram.ext import ContextTypes
 from telegram.error import RetryAfter
 
 from src.config import Config
-from src.database import add_message, get_history, clear_history, get_global_stats, get_user_stats
-from src.hf_client import generate_chat_stream, HuggingFaceAPIError
+from src.database import (
+    add_message,
+    add_messages_batch,
+    get_history,
+    get_user_role_counts,
+    clear_history,
+    get_global_stats,
+    get_user_stats,
+)
+from src.hf_client import stream_chat, get_client, HuggingFaceAPIError
 from src.middlewares import rate_limiter, validate_input
-from src.prompts import SYSTEM_PROMPT
+from src.telegram_limiter import telegram_limiter
+from src.prompts import get_system_message
 
 logger = logging.getLogger(__name__)
 
@@ -37,12 +47,11 @@ def _uptime() -> str:
     return " ".join(parts)
 
 
+_MD_ESCAPE = str.maketrans({char: f'\\{char}' for char in r'_*[]()~`>#+-=|{}.!'})
+
 def _escape_md(text: str) -> str:
-    """Escape special characters for MarkdownV2."""
-    special = r'_*[]()~`>#+-=|{}.!'
-    for char in special:
-        text = text.replace(char, f'\\{char}')
-    return text
+    """Escape special characters for MarkdownV2 (single translate pass)."""
+    return text.translate(_MD_ESCAPE)
 
 
 def _format_number(n: int) -> str:
@@ -50,6 +59,113 @@ def _format_number(n: int) -> str:
     return f"{n:,}"
 
 
+def _brace_escape(text: str) -> str:
+    """Make a config value safe to embed in a str.format template."""
+    return text.replace("{", "{{").replace("}", "}}")
+
+
+# Strong refs for fire-and-forget tasks; the loop only keeps weak ones
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _log_task_error(task: asyncio.Task):
+    _background_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"⚠️ Background task failed: {task.exception()}")
+
+
+def _fire_and_forget(coro) -> asyncio.Task:
+    """Schedule `coro` without awaiting it; failures are logged, never lost."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_log_task_error)
+    return task
+
+
+# Telegram rejects messages over 4096 chars; stay clear of it with room for the cursor
+_DISPLAY_LIMIT = 3800
+
+
+def _split_message(text: str, limit: int = _DISPLAY_LIMIT) -> list[str]:
+    """Split text into Telegram-sized parts at paragraph, line, sentence or word breaks."""
+    parts = []
+    while len(text) > limit:
+        window = text[:limit]
+        for sep in ("\n\n", "\n", ". ", " "):
+            cut = window.rfind(sep)
+            if cut > limit // 2:
+                cut += len(sep)
+                break
+        else:
+            cut = limit
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+# ╔══════════════════════════════════════════════════════════╗
+# ║                  PRE-RENDERED TEXTS                      ║
+# ╚══════════════════════════════════════════════════════════╝
+
+# Everything here is fixed for the process lifetime; only {uptime} varies
+_HELP_BODY = (
+    "📖 **Daftar Command**\n\n"
+    "🔹 `/start` — Mulai ulang & sambutan\n"
+    "🔹 `/reset` — Hapus histori percakapan\n"
+    "🔹 `/help` — Tampilkan bantuan ini\n"
+    "🔹 `/info` — Informasi tentang bot\n"
+    "🔹 `/mydata` — Statistik percakapan lu\n"
+    "🔹 `/ping` — Cek apakah bot hidup\n"
+)
+_HELP_ADMIN = (
+    "\n🔐 **Admin Commands**\n"
+    "🔸 `/stats` — Statistik global bot\n"
+    "🔸 `/health` — Health check sistem\n"
+)
+_HELP_FOOTER = (
+    "\n━━━━━━━━━━━━━━━━━━━━━━\n"
+    "💡 **Tips:** Langsung ketik pesan aja buat ngobrol!\n"
+    f"⚡ Rate limit: {Config.RATE_LIMIT} pesan/menit\n"
+    f"📝 Max input: {_format_number(Config.MAX_INPUT_CHARS)} karakter"
+)
+_HELP_TEXT_USER = _HELP_BODY + _HELP_FOOTER
+_HELP_TEXT_ADMIN = _HELP_BODY + _HELP_ADMIN + _HELP_FOOTER
+
+_INFO_TEMPLATE = (
+    f"🤖 **{_brace_escape(Config.BOT_NAME)}**\n"
+    f"_{_brace_escape(Config.BOT_DESCRIPTION)}_\n\n"
+    f"━━━━━━━━━━━━━━━━━━━━━━\n"
+    f"📦 **Version:** `{Config.BOT_VERSION}`\n"
+    f"🧠 **Model:** `{_brace_escape(Config.HF_MODEL_SHORT)}`\n"
+    f"🌡️ **Temperature:** `{Config.TEMPERATURE}`\n"
+    f"🎯 **Top-P:** `{Config.TOP_P}`\n"
+    f"📊 **Max Tokens:** `{_format_number(Config.MAX_NEW_TOKENS)}`\n"
+    f"💬 **Context Window:** `{Config.MAX_HISTORY_MESSAGES} messages`\n"
+    f"⏱️ **Uptime:** `{{uptime}}`\n"
+    f"━━━━━━━━━━━━━━━━━━━━━━"
+)
+
+_BOT_INFO_TEMPLATE = (
+    f"🤖 **{_brace_escape(Config.BOT_NAME)}** v{Config.BOT_VERSION}\n\n"
+    f"🧠 Model: `{_brace_escape(Config.HF_MODEL_SHORT)}`\n"
+    f"🌡️ Temp: `{Config.TEMPERATURE}` | Top-P: `{Config.TOP_P}`\n"
+    f"⏱️ Uptime: `{{uptime}}`"
+)
+
+
+# Updates are dispatched concurrently; this keeps turns ordered within one chat
+_chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def _chat_lock(chat_id: int) -> asyncio.Lock:
+    """Get the lock serializing AI turns for a chat (dropped once no turn holds it)."""
+    lock = _chat_locks.get(chat_id)
+    if lock is None:
+        lock = _chat_locks[chat_id] = asyncio.Lock()
+    return lock
+
+
 # ╔══════════════════════════════════════════════════════════╗
 # ║                  COMMAND HANDLERS                        ║
 # ╚══════════════════════════════════════════════════════════╝
@@ -79,7 +195,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         ]
     ])
 
-    await update.message.reply_text(
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
         welcome_text,
         parse_mode=ParseMode.MARKDOWN,
         reply_markup=keyboard
@@ -90,62 +207,35 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help - Show all available commands."""
     is_admin = update.effective_user.id in Config.ADMIN_IDS
+    help_text = _HELP_TEXT_ADMIN if is_admin else _HELP_TEXT_USER
 
-    help_text = (
-        "📖 **Daftar Command**\n\n"
-        "🔹 `/start` — Mulai ulang & sambutan\n"
-        "🔹 `/reset` — Hapus histori percakapan\n"
-        "🔹 `/help` — Tampilkan bantuan ini\n"
-        "🔹 `/info` — Informasi tentang bot\n"
-        "🔹 `/mydata` — Statistik percakapan lu\n"
-        "🔹 `/ping` — Cek apakah bot hidup\n"
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        help_text, parse_mode=ParseMode.MARKDOWN
     )
 
-    if is_admin:
-        help_text += (
-            "\n🔐 **Admin Commands**\n"
-            "🔸 `/stats` — Statistik global bot\n"
-            "🔸 `/health` — Health check sistem\n"
-        )
-
-    help_text += (
-        "\n━━━━━━━━━━━━━━━━━━━━━━\n"
-        "💡 **Tips:** Langsung ketik pesan aja buat ngobrol!\n"
-        f"⚡ Rate limit: {Config.RATE_LIMIT} pesan/menit\n"
-        f"📝 Max input: {_format_number(Config.MAX_INPUT_CHARS)} karakter"
-    )
-
-    await update.message.reply_text(help_text, parse_mode=ParseMode.MARKDOWN)
-
 
 async def info_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /info - Show bot information and specs."""
-    model_short = Config.HF_MODEL.split("/")[-1] if "/" in Config.HF_MODEL else Config.HF_MODEL
+    info_text = _INFO_TEMPLATE.format(uptime=_uptime())
 
-    info_text = (
-        f"🤖 **{Config.BOT_NAME}**\n"
-        f"_{Config.BOT_DESCRIPTION}_\n\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━\n"
-        f"📦 **Version:** `{Config.BOT_VERSION}`\n"
-        f"🧠 **Model:** `{model_short}`\n"
-        f"🌡️ **Temperature:** `{Config.TEMPERATURE}`\n"
-        f"🎯 **Top-P:** `{Config.TOP_P}`\n"
-        f"📊 **Max Tokens:** `{_format_number(Config.MAX_NEW_TOKENS)}`\n"
-        f"💬 **Context Window:** `{Config.MAX_HISTORY_MESSAGES} messages`\n"
-        f"⏱️ **Uptime:** `{_uptime()}`\n"
-        f"━━━━━━━━━━━━━━━━━━━━━━"
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        info_text, parse_mode=ParseMode.MARKDOWN
     )
 
-    await update.message.reply_text(info_text, parse_mode=ParseMode.MARKDOWN)
-
 
 async def ping_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /ping - Simple alive check with latency."""
     start = time.monotonic()
-    msg = await update.message.reply_text("🏓 Pong!")
+    msg = await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        "🏓 Pong!"
+    )
     latency_ms = (time.monotonic() - start) * 1000
 
-    await msg.edit_text(
+    await telegram_limiter.send(
+        update.effective_chat.id, msg.edit_text,
         f"🏓 **Pong!**\n"
         f"⚡ Latency: `{latency_ms:.0f}ms`\n"
         f"⏱️ Uptime: `{_uptime()}`",
@@ -158,7 +248,8 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     await clear_history(user_id)
 
-    await update.message.reply_text(
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
         "🧹 **Chat direset!**\n\n"
         "Ingatan percakapan udah dihapus. Fresh start! 🔄\n"
         "Langsung gas aja ketik pesan baru.",
@@ -167,16 +258,61 @@ async def reset_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"🔄 User {user_id} reset their chat history")
 
 
+# ── Stats caches (read lazily, refreshed on expiry) ──────────
+_STATS_TTL = 20.0
+_USER_STATS_TTL = 10.0
+_USER_STATS_MAX = 1024
+
+_stats_cache = {"ts": 0.0, "data": None}
+_stats_lock = asyncio.Lock()
+_user_stats_cache: dict[int, tuple[float, dict]] = {}
+
+
+async def _cached_global_stats() -> dict:
+    """get_global_stats() behind a _STATS_TTL cache; concurrent refreshes share one query."""
+    if time.monotonic() - _stats_cache["ts"] < _STATS_TTL:
+        return _stats_cache["data"]
+
+    async with _stats_lock:
+        if time.monotonic() - _stats_cache["ts"] < _STATS_TTL:
+            return _stats_cache["data"]
+        data = await get_global_stats()
+        _stats_cache.update(ts=time.monotonic(), data=data)
+        return data
+
+
+async def _cached_user_stats(user_id: int) -> dict:
+    """get_user_stats() behind a short per-user cache for repeated /mydata."""
+    now = time.monotonic()
+    cached = _user_stats_cache.get(user_id)
+    if cached is not None and now - cached[0] < _USER_STATS_TTL:
+        return cached[1]
+
+    data = await get_user_stats(user_id)
+    if len(_user_stats_cache) >= _USER_STATS_MAX:
+        # Drop expired entries; if still full, start over rather than grow unbounded
+        for uid in [uid for uid, (ts, _) in _user_stats_cache.items() if now - ts >= _USER_STATS_TTL]:
+            del _user_stats_cache[uid]
+        if len(_user_stats_cache) >= _USER_STATS_MAX:
+            _user_stats_cache.clear()
+    _user_stats_cache[user_id] = (time.monotonic(), data)
+    return data
+
+
 async def mydata_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /mydata - Show user's personal conversation stats."""
     user_id = update.effective_user.id
     user = update.effective_user
 
-    user_stats = await get_user_stats(user_id)
-    history = await get_history(user_id, limit=Config.MAX_HISTORY_MESSAGES)
+    # Independent reads run concurrently; role counts are done in SQL over the context window
+    user_stats, role_counts = await asyncio.gather(
+        _cached_user_stats(user_id),
+        get_user_role_counts(user_id, limit=Config.MAX_HISTORY_MESSAGES),
+    )
 
-    user_msgs = sum(1 for m in history if m.get("role") == "user")
-    bot_msgs = sum(1 for m in history if m.get("role") == "assistant")
+    user_msgs = role_counts.get("user", 0)
+    bot_msgs = role_counts.get("assistant", 0)
+    context_used = sum(role_counts.values())
 
     stats_text = (
         f"📊 **Data Lu, {user.first_name}**\n\n"
@@ -187,21 +323,27 @@ async def mydata_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📅 Pertama chat       : `{user_stats.get('first_seen', 'N/A')}`\n"
         f"🕐 Terakhir aktif     : `{user_stats.get('last_active', 'N/A')}`\n"
         f"━━━━━━━━━━━━━━━━━━━━━━\n"
-        f"🗂️ Context window     : `{len(history)}/{Config.MAX_HISTORY_MESSAGES}`"
+        f"🗂️ Context window     : `{context_used}/{Config.MAX_HISTORY_MESSAGES}`"
     )
 
-    await update.message.reply_text(stats_text, parse_mode=ParseMode.MARKDOWN)
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        stats_text, parse_mode=ParseMode.MARKDOWN
+    )
 
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats - Admin-only global statistics."""
     user_id = update.effective_user.id
     if user_id not in Config.ADMIN_IDS:
-        await update.message.reply_text("🚫 Lu ga punya akses ke command ini.")
+        await telegram_limiter.send(
+            update.effective_chat.id, update.message.reply_text,
+            "🚫 Lu ga punya akses ke command ini."
+        )
         logger.warning(f"⚠️ Unauthorized /stats attempt by user {user_id}")
         return
 
-    stats = await get_global_stats()
+    stats = await _cached_global_stats()
     uptime_str = _uptime()
 
     stats_text = (
@@ -211,39 +353,71 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"💬 Total Messages : `{_format_number(stats.get('total_messages', 0))}`\n"
         f"📈 Active Today   : `{_format_number(stats.get('active_today', 0))}`\n"
         f"⏱️ Uptime         : `{uptime_str}`\n"
-        f"🧠 Model          : `{Config.HF_MODEL.split('/')[-1]}`\n"
+        f"🧠 Model          : `{Config.HF_MODEL_SHORT}`\n"
         f"🌡️ Temperature    : `{Config.TEMPERATURE}`\n"
         f"━━━━━━━━━━━━━━━━━━━━━━"
     )
 
-    await update.message.reply_text(stats_text, parse_mode=ParseMode.MARKDOWN)
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        stats_text, parse_mode=ParseMode.MARKDOWN
+    )
+
+
+# HF reachability result, reused for _HEALTH_TTL seconds across /health calls
+_HEALTH_TTL = 30.0
+_health_cache = {"ts": 0.0, "status": None, "latency": None, "etag": None}
+_health_lock = asyncio.Lock()
+
+
+async def _probe_hf() -> tuple[str, str]:
+    """Return (status, latency) for the HF model endpoint; concurrent callers share one probe."""
+    if time.monotonic() - _health_cache["ts"] < _HEALTH_TTL:
+        return _health_cache["status"], _health_cache["latency"]
+
+    async with _health_lock:
+        # Another admin may have refreshed it while we waited
+        if time.monotonic() - _health_cache["ts"] < _HEALTH_TTL:
+            return _health_cache["status"], _health_cache["latency"]
+
+        # Reuses the shared HF keep-alive pool
+        client = await get_client()
+        hf_status = "❌ Unreachable"
+        hf_latency = "N/A"
+        url = "https://huggingface.co/api/models/" + Config.HF_MODEL
+        headers = {"Authorization": f"Bearer {Config.HF_TOKEN}"}
+        # Conditional HEAD: an unchanged model card answers 304 with no body
+        if _health_cache["etag"]:
+            headers["If-None-Match"] = _health_cache["etag"]
+        try:
+            start = time.monotonic()
+            resp = await client.head(url, headers=headers, timeout=10.0)
+            if resp.status_code in (405, 501):
+                resp = await client.get(url, headers=headers, timeout=10.0)
+            hf_latency = f"{(time.monotonic() - start) * 1000:.0f}ms"
+            if resp.status_code in (200, 304):
+                hf_status = "✅ Online"
+                _health_cache["etag"] = resp.headers.get("etag", _health_cache["etag"])
+            else:
+                hf_status = f"⚠️ Status {resp.status_code}"
+        except Exception as e:
+            hf_status = f"❌ Error: {str(e)[:50]}"
+
+        _health_cache.update(ts=time.monotonic(), status=hf_status, latency=hf_latency)
+        return hf_status, hf_latency
 
 
 async def health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /health - Admin-only system health check."""
     user_id = update.effective_user.id
     if user_id not in Config.ADMIN_IDS:
-        await update.message.reply_text("🚫 Admin only.")
+        await telegram_limiter.send(
+            update.effective_chat.id, update.message.reply_text,
+            "🚫 Admin only."
+        )
         return
 
-    # Check HF API reachability
-    import httpx
-    hf_status = "❌ Unreachable"
-    hf_latency = "N/A"
-    try:
-        start = time.monotonic()
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            resp = await client.get(
-                "https://huggingface.co/api/models/" + Config.HF_MODEL,
-                headers={"Authorization": f"Bearer {Config.HF_TOKEN}"}
-            )
-            hf_latency = f"{(time.monotonic() - start) * 1000:.0f}ms"
-            if resp.status_code == 200:
-                hf_status = "✅ Online"
-            else:
-                hf_status = f"⚠️ Status {resp.status_code}"
-    except Exception as e:
-        hf_status = f"❌ Error: {str(e)[:50]}"
+    hf_status, hf_latency = await _probe_hf()
 
     health_text = (
         f"🏥 **System Health Check**\n\n"
@@ -253,11 +427,14 @@ async def health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🧠 HF API Status  : {hf_status}\n"
         f"📡 HF Latency     : `{hf_latency}`\n"
         f"📦 Version        : `{Config.BOT_VERSION}`\n"
-        f"🔧 Model          : `{Config.HF_MODEL.split('/')[-1]}`\n"
+        f"🔧 Model          : `{Config.HF_MODEL_SHORT}`\n"
         f"━━━━━━━━━━━━━━━━━━━━━━"
     )
 
-    await update.message.reply_text(health_text, parse_mode=ParseMode.MARKDOWN)
+    await telegram_limiter.send(
+        update.effective_chat.id, update.message.reply_text,
+        health_text, parse_mode=ParseMode.MARKDOWN
+    )
 
 
 # ╔══════════════════════════════════════════════════════════╗
@@ -267,42 +444,58 @@ async def health_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline keyboard button presses."""
     query = update.callback_query
-    await query.answer()
+    # ACK in the background so the reset/edit below doesn't wait on it
+    _fire_and_forget(query.answer())
 
     if query.data == "reset_chat":
         user_id = query.from_user.id
         await clear_history(user_id)
-        await query.edit_message_text(
+        await telegram_limiter.send(
+            update.effective_chat.id, query.edit_message_text,
             "🧹 **Chat direset!** Fresh start! 🔄\n\nLangsung ketik pesan baru.",
             parse_mode=ParseMode.MARKDOWN
         )
         logger.info(f"🔄 User {user_id} reset via button")
 
     elif query.data == "bot_info":
-        model_short = Config.HF_MODEL.split("/")[-1] if "/" in Config.HF_MODEL else Config.HF_MODEL
-        info_text = (
-            f"🤖 **{Config.BOT_NAME}** v{Config.BOT_VERSION}\n\n"
-            f"🧠 Model: `{model_short}`\n"
-            f"🌡️ Temp: `{Config.TEMPERATURE}` | Top-P: `{Config.TOP_P}`\n"
-            f"⏱️ Uptime: `{_uptime()}`"
+        info_text = _BOT_INFO_TEMPLATE.format(uptime=_uptime())
+        await telegram_limiter.send(
+            update.effective_chat.id, query.edit_message_text,
+            info_text, parse_mode=ParseMode.MARKDOWN
         )
-        await query.edit_message_text(info_text, parse_mode=ParseMode.MARKDOWN)
 
 
 # ╔══════════════════════════════════════════════════════════╗
 # ║                  MESSAGE HANDLER                         ║
 # ╚══════════════════════════════════════════════════════════╝
 
+async def _report_failure(update: Update, chat_id: int, placeholder_message, text: str):
+    """Show an error in the placeholder, or as a reply if it was never sent."""
+    try:
+        if placeholder_message is None:
+            await telegram_limiter.send(
+                chat_id, update.message.reply_text, text, parse_mode=ParseMode.MARKDOWN
+            )
+        else:
+            await telegram_limiter.send(
+                chat_id, placeholder_message.edit_text, text, parse_mode=ParseMode.MARKDOWN
+            )
+    except Exception:
+        logger.exception(f"📤 Could not deliver error notice to chat {chat_id}:")
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming text messages - main AI conversation flow."""
     user_id = update.effective_user.id
     user_name = update.effective_user.first_name
     user_text = update.message.text
+    chat_id = update.effective_chat.id
 
     # ── Rate Limiting ────────────────────────────────────────
     if not rate_limiter.is_allowed(user_id):
-        remaining = rate_limiter.get_cooldown(user_id) if hasattr(rate_limiter, 'get_cooldown') else "beberapa"
-        await update.message.reply_text(
+        remaining = rate_limiter.get_cooldown(user_id)
+        await telegram_limiter.send(
+            chat_id, update.message.reply_text,
             f"⏳ Sabar bro, lu ngirim pesan kecepetan.\n"
             f"Tunggu `{remaining}` detik lagi ya.",
             parse_mode=ParseMode.MARKDOWN
@@ -313,72 +506,148 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # ── Input Validation ─────────────────────────────────────
     is_valid, sanitized_text = validate_input(user_text)
     if not is_valid:
-        await update.message.reply_text(f"⚠️ {sanitized_text}")
+        await telegram_limiter.send(chat_id, update.message.reply_text, f"⚠️ {sanitized_text}")
         return
 
-    # ── Show Typing ──────────────────────────────────────────
-    await update.message.chat.send_action(action=ChatAction.TYPING)
+    # ── One turn per chat at a time; chats run in parallel ───
+    async with _chat_lock(chat_id):
+        # ── Show Typing + load context (in parallel) ─────────
+        # The user turn stays in memory and is stored with the reply in one commit
+        _, history = await asyncio.gather(
+            update.message.chat.send_action(action=ChatAction.TYPING),
+            get_history(user_id, limit=max(Config.MAX_HISTORY_MESSAGES - 1, 0)),
+        )
 
-    # ── Build Context ────────────────────────────────────────
-    await add_message(user_id, "user", sanitized_text)
-    history = await get_history(user_id, limit=Config.MAX_HISTORY_MESSAGES)
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + history
+        # ── Build Context ────────────────────────────────────
+        messages = [
+            get_system_message(),
+            *history,
+            {"role": "user", "content": sanitized_text},
+        ]
 
-    logger.info(f"💬 [{user_name}:{user_id}] {sanitized_text[:80]}{'...' if len(sanitized_text) > 80 else ''}")
+        logger.info(f"💬 [{user_name}:{user_id}] {sanitized_text[:80]}{'...' if len(sanitized_text) > 80 else ''}")
 
-    # ── Streaming Response ───────────────────────────────────
-    placeholder_message = await update.message.reply_text("💭 _Mikir..._", parse_mode=ParseMode.MARKDOWN)
-    full_response = ""
-    last_edit_time = time.time()
-    chunk_count = 0
-    gen_start = time.monotonic()
+        # ── Streaming Response ───────────────────────────────
+        placeholder_message = None
+        # Collect chunks and join only when editing: += on str is quadratic
+        chunks: list[str] = []
+        total_len = 0
+        last_edit_time = time.monotonic()
+        last_edited_len = 0
+        edit_interval = Config.STREAM_EDIT_INTERVAL
+        chunk_count = 0
+        gen_start = time.monotonic()
+        user_saved = False
 
-    try:
-        async for chunk in generate_chat_stream(messages):
-            if not chunk.strip():
-                continue
-            full_response += chunk
-            chunk_count += 1
-            current_time = time.time()
-
-            if current_time - last_edit_time > Config.STREAM_EDIT_INTERVAL:
-                try:
-                    display_text = full_response + f" {Config.TYPING_CURSOR}"
-                    await placeholder_message.edit_text(display_text)
-                    last_edit_time = current_time
-                except RetryAfter as e:
-                    await asyncio.sleep(e.retry_after)
-                except Exception:
-                    pass
-
-        gen_duration = time.monotonic() - gen_start
-
-        if full_response.strip():
-            await placeholder_message.edit_text(full_response)
-            await add_message(user_id, "assistant", full_response)
-            logger.info(
-                f"✅ [{user_name}:{user_id}] Response sent | "
-                f"{len(full_response)} chars | {chunk_count} chunks | "
-                f"{gen_duration:.1f}s"
+        try:
+            placeholder_message = await telegram_limiter.send(
+                chat_id, update.message.reply_text,
+                "💭 _Mikir..._", parse_mode=ParseMode.MARKDOWN
             )
-        else:
-            raise HuggingFaceAPIError("Empty response from model.")
+            async for chunk in stream_chat(messages):
+                if not chunk.strip():
+                    continue
+                chunks.append(chunk)
+                total_len += len(chunk)
+                chunk_count += 1
+
+                # Edit only when enough new text arrived AND enough time has passed;
+                # the clock is read only once the cheap size gate passes
+                if (
+                    total_len - last_edited_len >= Config.STREAM_MIN_DELTA
+                    and (now := time.monotonic()) - last_edit_time > edit_interval
+                ):
+                    try:
+                        display_text = "".join(chunks)
+                        # Past the cap, show only the tail so each edit stays bounded
+                        if total_len > _DISPLAY_LIMIT:
+                            display_text = "…" + display_text[-(_DISPLAY_LIMIT - 1):]
+                        display_text += f" {Config.TYPING_CURSOR}"
+                        # No retry: a stale partial edit is not worth resending
+                        await telegram_limiter.send(
+                            chat_id, placeholder_message.edit_text, display_text, retries=0
+                        )
+                        last_edit_time = now
+                        last_edited_len = total_len
+                    except RetryAfter:
+                        # Telegram is throttling us: edit less often for the rest of this stream.
+                        # The limiter's shared backoff already holds every send until it clears.
+                        edit_interval = min(edit_interval * 2, 5.0)
+                    except Exception:
+                        pass
+
+            gen_duration = time.monotonic() - gen_start
+            full_response = "".join(chunks)
+
+            if full_response.strip():
+                # Long replies land as the edited placeholder plus follow-up messages
+                first, *rest = _split_message(full_response)
+
+                async def _deliver():
+                    await telegram_limiter.send(chat_id, placeholder_message.edit_text, first)
+                    for part in rest:
+                        await telegram_limiter.send(
+                            chat_id, context.bot.send_message, chat_id, part
+                        )
+
+                # Final edit and the turn's single DB commit run side by side;
+                # each outcome is handled on its own so one never masks the other
+                saved, delivered = await asyncio.gather(
+                    add_messages_batch(
+                        user_id, [("user", sanitized_text), ("assistant", full_response)]
+                    ),
+                    _deliver(),
+                    return_exceptions=True,
+                )
+                if isinstance(saved, BaseException):
+                    # user_saved stays False: the finally below still stores the user turn
+                    logger.error(
+                        f"💾 Failed to save turn for {user_name} (ID: {user_id}): {saved!r}",
+                        exc_info=saved,
+                    )
+                else:
+                    user_saved = True
+
+                if isinstance(delivered, BaseException):
+                    # Part of the reply may already be on screen: add a notice, don't overwrite it
+                    logger.error(
+                        f"📤 Failed to deliver reply to {user_name} (ID: {user_id}): {delivered!r}",
+                        exc_info=delivered,
+                    )
+                    await _report_failure(
+                        update, chat_id, None,
+                        "💥 **Jawabannya kepotong.**\n"
+                        "Coba kirim ulang pesannya ya."
+                    )
+                else:
+                    logger.info(
+                        f"✅ [{user_name}:{user_id}] Response sent | "
+                        f"{total_len} chars | {chunk_count} chunks | "
+                        f"{gen_duration:.1f}s"
+                    )
+            else:
+                raise HuggingFaceAPIError("Empty response from model.")
 
-    except HuggingFaceAPIError as e:
-        await placeholder_message.edit_text(
-            "⚠️ **AI lagi gangguan nih.**\n"
-            "Coba lagi ntar ya, biasanya bentar doang.",
-            parse_mode=ParseMode.MARKDOWN
-        )
-        logger.error(f"❌ Generation error for {user_name} (ID: {user_id}): {e}")
+        except HuggingFaceAPIError as e:
+            await _report_failure(
+                update, chat_id, placeholder_message,
+                "⚠️ **AI lagi gangguan nih.**\n"
+                "Coba lagi ntar ya, biasanya bentar doang."
+            )
+            logger.error(f"❌ Generation error for {user_name} (ID: {user_id}): {e}")
 
-    except Exception as e:
-        await placeholder_message.edit_text(
-            "💥 **Ada error aneh.**\n"
-            "Gue lagi dibenerin, coba lagi ntar.",
-            parse_mode=ParseMode.MARKDOWN
-        )
-        logger.exception(f"💥 Unexpected error for {user_name} (ID: {user_id}):")
+        except Exception as e:
+            await _report_failure(
+                update, chat_id, placeholder_message,
+                "💥 **Ada error aneh.**\n"
+                "Gue lagi dibenerin, coba lagi ntar."
+            )
+            logger.exception(f"💥 Unexpected error for {user_name} (ID: {user_id}):")
+
+        finally:
+            # Failed turns still keep the user's side of the conversation
+            if not user_saved:
+                await add_message(user_id, "user", sanitized_text)
 
 
 # ╔══════════════════════════════════════════════════════════╗
@@ -391,7 +660,8 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if update and update.effective_message:
         try:
-            await update.effective_message.reply_text(
+            await telegram_limiter.send(
+                update.effective_chat.id, update.effective_message.reply_text,
                 "💥 Ada error yang ga ketangkep. Tim gue lagi cek.",
                 parse_mode=ParseMode.MARKDOWN
             )
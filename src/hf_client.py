@@ -1,7 +1,9 @@
 # src/hf_client.py
 import httpx
-import json
+import hashlib
+import orjson
 import time
+import asyncio
 import logging
 from tenacity import (
     retry,
@@ -73,6 +75,82 @@ class _APIStats:
 api_stats = _APIStats()
 
 
+# ╔══════════════════════════════════════════════════════════╗
+# ║              🔌 SHARED HTTP CLIENT                       ║
+# ╚══════════════════════════════════════════════════════════╝
+
+# One keep-alive HTTP/2 pool for every HF call: no TCP+TLS handshake per message
+_CLIENT: httpx.AsyncClient | None = None
+_client_lock = asyncio.Lock()
+
+
+async def get_client() -> httpx.AsyncClient:
+    """Return the shared HF client, creating it on first use (inside the running loop)."""
+    global _CLIENT
+    if _CLIENT is None:
+        async with _client_lock:
+            if _CLIENT is None:
+                _CLIENT = httpx.AsyncClient(
+                    http2=True,
+                    timeout=httpx.Timeout(90.0, connect=10.0),
+                    limits=httpx.Limits(
+                        max_connections=50,
+                        max_keepalive_connections=20,
+                        keepalive_expiry=60,
+                    ),
+                )
+    return _CLIENT
+
+
+async def close_client():
+    """Close the shared HF client (call on shutdown)."""
+    global _CLIENT
+    if _CLIENT is not None:
+        client, _CLIENT = _CLIENT, None
+        await client.aclose()
+        logger.info("🔌 HF HTTP client closed")
+
+
+# SSE framing constants, matched against raw bytes in the stream loop
+_SSE_PREFIX = b"data: "
+_SSE_PREFIX_LEN = len(_SSE_PREFIX)
+_SSE_DONE = b"[DONE]"
+
+
+# Request headers and fields fixed by the (frozen) config; only "messages" changes per call
+_HEADERS = {
+    "Authorization": f"Bearer {Config.HF_TOKEN}",
+    "Content-Type": "application/json",
+    "Accept": "text/event-stream",
+}
+_PAYLOAD_SKELETON = {
+    "model": Config.HF_MODEL,
+    "temperature": Config.TEMPERATURE,
+    "top_p": Config.TOP_P,
+    "max_tokens": Config.MAX_NEW_TOKENS,
+    "stream": True,
+}
+
+
+def _parse_sse_event(lines: list[bytes]) -> tuple[str, bool]:
+    """Decode one SSE event's data lines into (content delta, stream finished)."""
+    payload = lines[0] if len(lines) == 1 else b"\n".join(lines)
+    if payload == _SSE_DONE:
+        return "", True
+
+    try:
+        choices = orjson.loads(payload).get("choices")
+        if not choices:
+            return "", False
+        first = choices[0]
+        return first.get("delta", {}).get("content") or "", first.get("finish_reason") == "stop"
+    except orjson.JSONDecodeError:
+        logger.warning(f"⚠️ Malformed JSON chunk: {payload[:100]!r}")
+    except Exception as e:
+        logger.warning(f"⚠️ SSE parse error: {e}")
+    return "", False
+
+
 def _get_error_message(status_code: int) -> str:
     """Return user-friendly error message based on HTTP status."""
     error_map = {
@@ -96,11 +174,13 @@ def _get_error_message(status_code: int) -> str:
     before_sleep=before_sleep_log(logger, logging.WARNING),
     reraise=True,
 )
-async def generate_chat_stream(messages: list):
+async def generate_chat_stream(messages: list, client: httpx.AsyncClient | None = None):
     """
     Communicates with Hugging Face via OpenAI-compatible endpoint.
     Yields chunks of response text for streaming display.
 
+    Uses the module's shared keep-alive client unless a `client` is passed.
+
     Features:
     - SSE streaming support
     - Fallback to JSON response
@@ -108,153 +188,236 @@ async def generate_chat_stream(messages: list):
     - Performance tracking
     """
 
-    headers = {
-        "Authorization": f"Bearer {Config.HF_TOKEN}",
-        "Content-Type": "application/json",
-        "Accept": "text/event-stream",
-    }
-
-    payload = {
-        "model": Config.HF_MODEL,
-        "messages": messages,
-        "temperature": Config.TEMPERATURE,
-        "top_p": Config.TOP_P,
-        "max_tokens": Config.MAX_NEW_TOKENS,
-        "stream": True,
-    }
+    body = orjson.dumps({**_PAYLOAD_SKELETON, "messages": messages})
 
     start_time = time.monotonic()
     total_chars = 0
-    model_short = Config.HF_MODEL.split("/")[-1] if "/" in Config.HF_MODEL else Config.HF_MODEL
 
     logger.debug(
-        f"🚀 Sending request to HF | Model: {model_short} | "
+        f"🚀 Sending request to HF | Model: {Config.HF_MODEL_SHORT} | "
         f"Messages: {len(messages)} | Temp: {Config.TEMPERATURE}"
     )
 
-    async with httpx.AsyncClient(timeout=90.0) as client:
-        try:
-            async with client.stream(
-                "POST",
-                Config.HF_API_URL,
-                json=payload,
-                headers=headers,
-            ) as response:
-
-                # ── Error Handling ───────────────────────────
-                if response.status_code != 200:
-                    err_body = await response.aread()
-                    err_decoded = err_body.decode(errors="replace")
-                    friendly_msg = _get_error_message(response.status_code)
-
-                    logger.error(
-                        f"❌ HF API Error [{response.status_code}]: {err_decoded[:300]}"
-                    )
+    if client is None:
+        client = await get_client()
+
+    try:
+        async with client.stream(
+            "POST",
+            Config.HF_API_URL,
+            content=body,
+            headers=_HEADERS,
+            timeout=90.0,
+        ) as response:
+
+            # ── Error Handling ───────────────────────────────
+            if response.status_code != 200:
+                err_body = await response.aread()
+                err_decoded = err_body.decode(errors="replace")
+                friendly_msg = _get_error_message(response.status_code)
+
+                logger.error(
+                    f"❌ HF API Error [{response.status_code}]: {err_decoded[:300]}"
+                )
+                api_stats.record_failure()
+
+                # Don't retry on client errors (4xx) except 429
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    raise HuggingFaceAPIError(friendly_msg, response.status_code)
+
+                raise HuggingFaceAPIError(friendly_msg, response.status_code)
+
+            content_type = response.headers.get("content-type", "")
+
+            # ── CASE 1: SSE Streaming ────────────────────────
+            if "text/event-stream" in content_type:
+                logger.debug("📡 Receiving SSE stream...")
+                chunk_count = 0
+
+                # Frame lines ourselves on raw bytes: no per-line str decode
+                buf = bytearray()
+                event: list[bytes] = []  # data: lines of the event being assembled
+                done = False
+
+                async for data in response.aiter_bytes():
+                    buf += data
+                    # Walk complete lines with a cursor; consumed bytes are dropped
+                    # once per network chunk, not shifted out line by line
+                    pos = 0
+                    while (nl := buf.find(b"\n", pos)) != -1:
+                        start, pos = pos, nl + 1
+                        # LF and CRLF endings alike, even when split across chunks
+                        end = nl - 1 if nl > start and buf[nl - 1] == 0x0D else nl
+
+                        if end > start:
+                            # Only data: lines count; event:/id:/": keep-alive" are skipped
+                            if buf.startswith(_SSE_PREFIX, start):
+                                event.append(bytes(buf[start + _SSE_PREFIX_LEN:end]))
+                            continue
+
+                        # Blank line ends the event; coalesced events each get their own
+                        if not event:
+                            continue
+                        chunk, done = _parse_sse_event(event)
+                        event.clear()
+                        if chunk:
+                            total_chars += len(chunk)
+                            chunk_count += 1
+                            yield chunk
+                        if done:
+                            break
+
+                    if done:
+                        break
+                    del buf[:pos]
+
+                # A server that closes without the final blank line still gets its last event
+                if not done and buf.startswith(_SSE_PREFIX):
+                    event.append(bytes(buf[_SSE_PREFIX_LEN:]).rstrip(b"\r"))
+                if event and not done:
+                    chunk, done = _parse_sse_event(event)
+                    if chunk:
+                        total_chars += len(chunk)
+                        chunk_count += 1
+                        yield chunk
+
+                logger.debug(f"✅ SSE stream completed | {chunk_count} chunks")
+
+            # ── CASE 2: Fallback JSON ────────────────────────
+            else:
+                logger.debug("📦 Receiving JSON fallback response...")
+                raw_data = await response.aread()
+
+                try:
+                    data = orjson.loads(raw_data)
+                except orjson.JSONDecodeError:
+                    logger.error(f"❌ Failed to parse JSON response: {raw_data[:200]}")
                     api_stats.record_failure()
+                    raise HuggingFaceAPIError("Invalid JSON response from model.")
 
-                    # Don't retry on client errors (4xx) except 429
-                    if 400 <= response.status_code < 500 and response.status_code != 429:
-                        raise HuggingFaceAPIError(friendly_msg, response.status_code)
+                choices = data.get("choices", [])
+                if not choices:
+                    logger.error(f"❌ Empty choices in response: {data}")
+                    api_stats.record_failure()
+                    raise HuggingFaceAPIError("Model returned empty response.")
 
-                    raise HuggingFaceAPIError(friendly_msg, response.status_code)
+                message_obj = choices[0].get("message", {})
+                content = message_obj.get("content", "")
 
-                content_type = response.headers.get("content-type", "")
+                if not content:
+                    logger.error(f"❌ Empty content in response: {data}")
+                    api_stats.record_failure()
+                    raise HuggingFaceAPIError("Model returned empty content.")
+
+                # Check for usage info
+                usage = data.get("usage", {})
+                if usage:
+                    logger.info(
+                        f"📊 Usage: prompt={usage.get('prompt_tokens', '?')} | "
+                        f"completion={usage.get('completion_tokens', '?')} | "
+                        f"total={usage.get('total_tokens', '?')}"
+                    )
 
-                # ── CASE 1: SSE Streaming ────────────────────
-                if "text/event-stream" in content_type:
-                    logger.debug("📡 Receiving SSE stream...")
-                    chunk_count = 0
+                total_chars = len(content)
+                yield content
 
-                    async for line in response.aiter_lines():
-                        if not line.startswith("data: "):
-                            continue
+        # ── Record Success ───────────────────────────────────
+        latency = time.monotonic() - start_time
+        api_stats.record_success(total_chars, latency)
+        logger.info(
+            f"✅ HF Response | {total_chars} chars | {latency:.1f}s | "
+            f"{api_stats.summary()}"
+        )
 
-                        data_str = line[6:].strip()
-                        if data_str == "[DONE]":
-                            logger.debug(f"✅ SSE stream completed | {chunk_count} chunks")
-                            break
+    except httpx.TimeoutException:
+        api_stats.record_failure()
+        logger.error(f"⏰ HF API Timeout after {time.monotonic() - start_time:.1f}s")
+        raise HuggingFaceAPIError("Model terlalu lama merespon. Coba lagi.")
 
-                        try:
-                            data_json = json.loads(data_str)
-                            choices = data_json.get("choices")
-                            if not choices or len(choices) == 0:
-                                continue
+    except httpx.RequestError as e:
+        api_stats.record_failure()
+        logger.error(f"🌐 Network error: {e}")
+        raise HuggingFaceAPIError(f"Koneksi ke AI gagal: {str(e)[:100]}")
 
-                            delta = choices[0].get("delta", {})
-                            finish_reason = choices[0].get("finish_reason")
 
-                            chunk = delta.get("content", "")
-                            if chunk:
-                                total_chars += len(chunk)
-                                chunk_count += 1
-                                yield chunk
+# ╔══════════════════════════════════════════════════════════╗
+# ║              🔗 SHARED STREAMS (single-flight)           ║
+# ╚══════════════════════════════════════════════════════════╝
 
-                            if finish_reason == "stop":
-                                logger.debug("✅ Stream finished (stop reason)")
-                                break
+# Identical prompts only yield identical answers when sampling is off (or opted in)
+_SHARE_STREAMS = Config.TEMPERATURE == 0 or Config.STREAM_SHARE
+_STREAM_END = object()
 
-                        except json.JSONDecodeError:
-                            logger.warning(f"⚠️ Malformed JSON chunk: {data_str[:100]}")
-                            continue
-                        except Exception as e:
-                            logger.warning(f"⚠️ SSE parse error: {e}")
-                            continue
 
-                # ── CASE 2: Fallback JSON ────────────────────
-                else:
-                    logger.debug("📦 Receiving JSON fallback response...")
-                    raw_data = await response.aread()
-
-                    try:
-                        data = json.loads(raw_data)
-                    except json.JSONDecodeError:
-                        logger.error(f"❌ Failed to parse JSON response: {raw_data[:200]}")
-                        api_stats.record_failure()
-                        raise HuggingFaceAPIError("Invalid JSON response from model.")
-
-                    choices = data.get("choices", [])
-                    if not choices:
-                        logger.error(f"❌ Empty choices in response: {data}")
-                        api_stats.record_failure()
-                        raise HuggingFaceAPIError("Model returned empty response.")
-
-                    message_obj = choices[0].get("message", {})
-                    content = message_obj.get("content", "")
-
-                    if not content:
-                        logger.error(f"❌ Empty content in response: {data}")
-                        api_stats.record_failure()
-                        raise HuggingFaceAPIError("Model returned empty content.")
-
-                    # Check for usage info
-                    usage = data.get("usage", {})
-                    if usage:
-                        logger.info(
-                            f"📊 Usage: prompt={usage.get('prompt_tokens', '?')} | "
-                            f"completion={usage.get('completion_tokens', '?')} | "
-                            f"total={usage.get('total_tokens', '?')}"
-                        )
-
-                    total_chars = len(content)
-                    yield content
-
-            # ── Record Success ───────────────────────────────
-            latency = time.monotonic() - start_time
-            api_stats.record_success(total_chars, latency)
-            logger.info(
-                f"✅ HF Response | {total_chars} chars | {latency:.1f}s | "
-                f"{api_stats.summary()}"
-            )
-
-        except httpx.TimeoutException:
-            api_stats.record_failure()
-            logger.error(f"⏰ HF API Timeout after {time.monotonic() - start_time:.1f}s")
-            raise HuggingFaceAPIError("Model terlalu lama merespon. Coba lagi.")
-
-        except httpx.RequestError as e:
-            api_stats.record_failure()
-            logger.error(f"🌐 Network error: {e}")
-            raise HuggingFaceAPIError(f"Koneksi ke AI gagal: {str(e)[:100]}")
+class _SharedStream:
+    """One upstream HF stream fanned out to every attached consumer."""
+    __slots__ = ("chunks", "consumers", "task")
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.consumers: list[asyncio.Queue] = []
+        self.task: asyncio.Task | None = None
+
+    def attach(self) -> asyncio.Queue:
+        """New consumer queue, pre-filled with what was already streamed."""
+        queue = asyncio.Queue()
+        for chunk in self.chunks:
+            queue.put_nowait(chunk)
+        self.consumers.append(queue)
+        return queue
+
+
+_inflight: dict[bytes, _SharedStream] = {}
+
+
+async def _produce(key: bytes, shared: _SharedStream, messages: list):
+    end: object = HuggingFaceAPIError("Stream dibatalin.")
+    try:
+        async for chunk in generate_chat_stream(messages):
+            shared.chunks.append(chunk)
+            for queue in shared.consumers:
+                queue.put_nowait(chunk)
+        end = _STREAM_END
+    except Exception as e:
+        end = e
+    finally:
+        # Evict first so later prompts start a fresh stream
+        _inflight.pop(key, None)
+        for queue in shared.consumers:
+            queue.put_nowait(end)
+
+
+async def stream_chat(messages: list):
+    """
+    generate_chat_stream(), but concurrent calls with the same `messages`
+    share one upstream stream; late joiners get the chunks so far replayed.
+    """
+    if not _SHARE_STREAMS:
+        async for chunk in generate_chat_stream(messages):
+            yield chunk
+        return
+
+    key = hashlib.blake2b(orjson.dumps(messages), digest_size=16).digest()
+    shared = _inflight.get(key)
+    if shared is None:
+        shared = _inflight[key] = _SharedStream()
+        shared.task = asyncio.create_task(_produce(key, shared, messages))
+    else:
+        logger.debug(f"🔗 Joined in-flight HF stream | {len(shared.chunks)} chunks replayed")
+
+    queue = shared.attach()
+    try:
+        while (item := await queue.get()) is not _STREAM_END:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        shared.consumers.remove(queue)
+        # Nobody left listening: stop paying for the upstream stream
+        if not shared.consumers and not shared.task.done():
+            shared.task.cancel()
+            if _inflight.get(key) is shared:
+                del _inflight[key]
 
 
 def get_api_stats() -> dict:
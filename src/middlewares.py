@@ -1,9 +1,11 @@
 # src/middlewares.py
 import re
+import math
 import time
+import heapq
 import logging
-from collections import defaultdict
-from dataclasses import dataclass, field
+from itertools import islice
+from dataclasses import dataclass
 from src.config import Config
 
 logger = logging.getLogger(__name__)
@@ -14,19 +16,24 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class _UserRateData:
-    """Track per-user rate limiting data."""
-    requests: list = field(default_factory=list)
+    """Track per-user rate limiting data (two window counters, not a timestamp list)."""
+    # Monotonic time starts near 0 on fresh boots, so no real window may equal the default
+    window_start: float = float("-inf")
+    curr_count: int = 0
+    prev_count: int = 0
     total_blocked: int = 0
     total_allowed: int = 0
-    last_blocked_at: float = 0.0
+    last_blocked_at: float = 0.0  # time.monotonic()
 
 
 class RateLimiter:
     """
-    Sliding window rate limiter with cooldown tracking and analytics.
+    Sliding-window-counter rate limiter with cooldown tracking and analytics.
     
     Features:
-    - Sliding window algorithm (not fixed window)
+    - Sliding window estimated from the current + previous fixed window,
+      weighted by how much of the previous one still overlaps
+    - O(1) time and memory per user
     - Per-user cooldown info
     - Block/allow statistics
     - Auto-cleanup of stale user data
@@ -36,7 +43,10 @@ class RateLimiter:
     def __init__(self, limit: int, window: int = 60):
         self.limit = limit
         self.window = window
-        self._users: dict[int, _UserRateData] = defaultdict(_UserRateData)
+        # Plain dict: only is_allowed() creates entries, so probing reads can't grow it
+        self._users: dict[int, _UserRateData] = {}
+        # (window end, user_id) per active window; cleanup pops only expired heads
+        self._expiry_heap: list[tuple[float, int]] = []
         self._global_blocked = 0
         self._global_allowed = 0
         logger.info(
@@ -44,6 +54,30 @@ class RateLimiter:
             f"Limit: {self.limit} req/{self.window}s"
         )
 
+    def _counts(self, data: _UserRateData, now: float) -> tuple[float, int, int]:
+        """(window_start, prev_count, curr_count) as of `now`, without mutating `data`."""
+        start = now - now % self.window
+        if start == data.window_start:
+            return start, data.prev_count, data.curr_count
+        if start - data.window_start == self.window:
+            return start, data.curr_count, 0
+        return start, 0, 0
+
+    def _estimate(self, data: _UserRateData, now: float) -> float:
+        """Requests in the sliding window ending at `now`."""
+        start, prev, curr = self._counts(data, now)
+        return prev * (1 - (now - start) / self.window) + curr
+
+    def _push_expiry(self, user_id: int, window_end: float):
+        """Index a user's new window; compact the heap once stale entries dominate."""
+        heap = self._expiry_heap
+        heapq.heappush(heap, (window_end, user_id))
+        # Each user leaves one entry per window it was active in. Rebuilding from
+        # the live windows at 2x keeps the heap O(users) at O(1) amortized cost.
+        if len(heap) > 2 * len(self._users) + 64:
+            heap[:] = [(data.window_start + self.window, uid) for uid, data in self._users.items()]
+            heapq.heapify(heap)
+
     def is_allowed(self, user_id: int) -> bool:
         """
         Check if user is within rate limit.
@@ -54,26 +88,32 @@ class RateLimiter:
             self._global_allowed += 1
             return True
 
-        now = time.time()
-        data = self._users[user_id]
+        now = time.monotonic()
+        data = self._users.get(user_id)
+        if data is None:
+            data = self._users[user_id] = _UserRateData()
 
-        # ── Clean expired requests ───────────────────────────
-        data.requests = [t for t in data.requests if t > now - self.window]
+        # ── Rotate windows ───────────────────────────────────
+        start, data.prev_count, data.curr_count = self._counts(data, now)
+        if start != data.window_start:
+            data.window_start = start
+            self._push_expiry(user_id, start + self.window)
 
         # ── Check limit ──────────────────────────────────────
-        if len(data.requests) >= self.limit:
+        estimate = self._estimate(data, now)
+        if estimate >= self.limit:
             data.total_blocked += 1
             data.last_blocked_at = now
             self._global_blocked += 1
             logger.debug(
                 f"⏳ Rate limited user {user_id} | "
-                f"{len(data.requests)}/{self.limit} in window | "
+                f"{estimate:.1f}/{self.limit} in window | "
                 f"Total blocks: {data.total_blocked}"
             )
             return False
 
         # ── Allow and record ─────────────────────────────────
-        data.requests.append(now)
+        data.curr_count += 1
         data.total_allowed += 1
         self._global_allowed += 1
         return True
@@ -86,16 +126,26 @@ class RateLimiter:
         if user_id in Config.ADMIN_IDS:
             return 0
 
-        now = time.time()
-        data = self._users[user_id]
-        data.requests = [t for t in data.requests if t > now - self.window]
+        data = self._users.get(user_id)
+        if data is None:
+            return 0
+
+        now = time.monotonic()
+        return self._cooldown(*self._counts(data, now), now)
 
-        if len(data.requests) < self.limit:
+    def _cooldown(self, start: float, prev: int, curr: int, now: float) -> int:
+        """Cooldown seconds at `now` for the given window counters (0 = not limited)."""
+        if prev * (1 - (now - start) / self.window) + curr < self.limit:
             return 0
 
-        # Oldest request in window determines when slot opens
-        oldest = min(data.requests)
-        cooldown = int((oldest + self.window) - now) + 1
+        # Solve prev' * (1 - elapsed / window) + curr' < limit for the elapsed time
+        if curr < self.limit:
+            # The previous window's weight decays enough within this window
+            unblock_at = start + self.window * (1 - (self.limit - curr) / prev)
+        else:
+            # Only once this window becomes the "previous" one
+            unblock_at = start + self.window * (2 - self.limit / curr)
+        cooldown = int(unblock_at - now) + 1
         return max(cooldown, 1)
 
     def get_remaining(self, user_id: int) -> int:
@@ -103,10 +153,12 @@ class RateLimiter:
         if user_id in Config.ADMIN_IDS:
             return self.limit  # Admins always have full quota display
 
-        now = time.time()
-        data = self._users[user_id]
-        data.requests = [t for t in data.requests if t > now - self.window]
-        return max(0, self.limit - len(data.requests))
+        data = self._users.get(user_id)
+        if data is None:
+            return self.limit
+
+        estimate = self._estimate(data, time.monotonic())
+        return max(0, math.ceil(self.limit - estimate))
 
     def get_user_stats(self, user_id: int) -> dict:
         """Get rate limiting stats for a specific user."""
@@ -120,23 +172,31 @@ class RateLimiter:
                 "cooldown": 0,
             }
 
-        now = time.time()
-        active = [t for t in data.requests if t > now - self.window]
+        # One clock read and one window rotation for all three derived fields
+        now = time.monotonic()
+        start, prev, curr = self._counts(data, now)
+        estimate = prev * (1 - (now - start) / self.window) + curr
+        if user_id in Config.ADMIN_IDS:
+            remaining, cooldown = self.limit, 0
+        else:
+            remaining = max(0, math.ceil(self.limit - estimate))
+            cooldown = self._cooldown(start, prev, curr, now)
+
         return {
             "total_allowed": data.total_allowed,
             "total_blocked": data.total_blocked,
-            "current_window": len(active),
-            "remaining": self.get_remaining(user_id),
-            "cooldown": self.get_cooldown(user_id),
+            "current_window": math.ceil(estimate),
+            "remaining": remaining,
+            "cooldown": cooldown,
         }
 
     def get_global_stats(self) -> dict:
         """Get global rate limiter statistics."""
-        now = time.time()
+        now = time.monotonic()
         active_users = sum(
             1
             for data in self._users.values()
-            if any(t > now - self.window for t in data.requests)
+            if self._estimate(data, now) > 0
         )
         return {
             "total_tracked_users": len(self._users),
@@ -154,19 +214,21 @@ class RateLimiter:
 
     def cleanup_stale(self, max_age: int = 3600):
         """Remove users who haven't made requests in max_age seconds."""
-        now = time.time()
-        stale_users = [
-            uid
-            for uid, data in self._users.items()
-            if not data.requests or max(data.requests) < now - max_age
-        ]
-        for uid in stale_users:
-            del self._users[uid]
-
-        if stale_users:
-            logger.debug(f"🧹 RateLimiter cleanup: removed {len(stale_users)} stale users")
-
-        return len(stale_users)
+        cutoff = time.monotonic() - max_age
+        heap = self._expiry_heap
+        removed = 0
+        while heap and heap[0][0] < cutoff:
+            window_end, uid = heapq.heappop(heap)
+            data = self._users.get(uid)
+            # Lazy deletion: users seen since then have a newer entry further down
+            if data is not None and data.window_start + self.window == window_end:
+                del self._users[uid]
+                removed += 1
+
+        if removed:
+            logger.debug(f"🧹 RateLimiter cleanup: removed {removed} stale users")
+
+        return removed
 
     def reset_user(self, user_id: int):
         """Reset rate limit data for a specific user."""
@@ -183,24 +245,28 @@ rate_limiter = RateLimiter(Config.RATE_LIMIT)
 # ║              🛡️ INPUT VALIDATION (Enhanced)              ║
 # ╚══════════════════════════════════════════════════════════╝
 
-# Patterns that might indicate prompt injection or abuse
+# Patterns that might indicate prompt injection or abuse.
+# Every \s++ is possessive (3.11+): the next token never starts with whitespace,
+# so giving back spaces can't help a match; no whitespace run is ever re-tried.
 _SUSPICIOUS_PATTERNS = [
-    r"ignore\s+(all\s+)?previous\s+instructions",
-    r"ignore\s+(all\s+)?above",
-    r"disregard\s+(all\s+)?previous",
-    r"you\s+are\s+now\s+DAN",
-    r"act\s+as\s+if\s+you\s+have\s+no\s+restrictions",
-    r"pretend\s+you\s+(are|have)\s+no\s+(rules|restrictions|limits)",
+    r"ignore\s++(all\s++)?previous\s++instructions",
+    r"ignore\s++(all\s++)?above",
+    r"disregard\s++(all\s++)?previous",
+    r"you\s++are\s++now\s++DAN",
+    r"act\s++as\s++if\s++you\s++have\s++no\s++restrictions",
+    r"pretend\s++you\s++(are|have)\s++no\s++(rules|restrictions|limits)",
     r"jailbreak",
-    r"override\s+system\s+prompt",
-    r"reveal\s+(your|the)\s+system\s+prompt",
-    r"show\s+(me\s+)?(your|the)\s+(system\s+)?prompt",
-    r"what\s+(is|are)\s+your\s+(system\s+)?(instructions|prompt|rules)",
+    r"override\s++system\s++prompt",
+    r"reveal\s++(your|the)\s++system\s++prompt",
+    r"show\s++(me\s++)?(your|the)\s++(system\s++)?prompt",
+    r"what\s++(is|are)\s++your\s++(system\s++)?(instructions|prompt|rules)",
 ]
 
-_compiled_patterns = [
-    re.compile(pattern, re.IGNORECASE) for pattern in _SUSPICIOUS_PATTERNS
-]
+# One alternation with a named group per pattern: a single scan per message
+_COMBINED_PATTERN = re.compile(
+    "|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(_SUSPICIOUS_PATTERNS)),
+    re.IGNORECASE,
+)
 
 # Characters/sequences that serve no conversational purpose
 _SPAM_INDICATORS = {
@@ -209,6 +275,9 @@ _SPAM_INDICATORS = {
     "min_meaningful_chars": 1,     # Must have at least 1 non-whitespace char
 }
 
+# Any char followed by max_repeating_chars more copies of itself
+_REPEAT_RE = re.compile(r'(.)\1{' + str(_SPAM_INDICATORS["max_repeating_chars"]) + r',}')
+
 
 def validate_input(text: str) -> tuple[bool, str]:
     """
@@ -238,33 +307,35 @@ def validate_input(text: str) -> tuple[bool, str]:
         )
 
     # ── Check minimum meaningful content ─────────────────────
-    meaningful = re.sub(r'\s+', '', cleaned)
-    if len(meaningful) < _SPAM_INDICATORS["min_meaningful_chars"]:
+    # Count non-whitespace chars lazily, stopping as soon as there are enough
+    needed = _SPAM_INDICATORS["min_meaningful_chars"]
+    meaningful = sum(1 for _ in islice((ch for ch in cleaned if not ch.isspace()), needed))
+    if meaningful < needed:
         return False, "Pesan lu cuma spasi doang. Serius dikit 😑"
 
     # ── Check repeating characters (spam) ────────────────────
-    repeat_match = re.search(r'(.)\1{' + str(_SPAM_INDICATORS["max_repeating_chars"]) + r',}', cleaned)
+    repeat_match = _REPEAT_RE.search(cleaned)
     if repeat_match:
         return False, "Spam detected 🚫 Jangan kirim karakter berulang terus dong."
 
     # ── Check repeating lines (spam) ─────────────────────────
     lines = [line.strip() for line in cleaned.split('\n') if line.strip()]
     if len(lines) > 1:
-        from collections import Counter
-        line_counts = Counter(lines)
-        most_common_count = line_counts.most_common(1)[0][1] if line_counts else 0
-        if most_common_count > _SPAM_INDICATORS["max_repeating_lines"]:
-            return False, "Spam detected 🚫 Jangan copas baris yang sama berulang kali."
+        # Running counts: bail out on the first line past the threshold
+        max_repeats = _SPAM_INDICATORS["max_repeating_lines"]
+        line_counts: dict[str, int] = {}
+        for line in lines:
+            count = line_counts[line] = line_counts.get(line, 0) + 1
+            if count > max_repeats:
+                return False, "Spam detected 🚫 Jangan copas baris yang sama berulang kali."
 
     # ── Check prompt injection (log warning, don't block) ────
-    for pattern in _compiled_patterns:
-        if pattern.search(cleaned):
-            logger.warning(
-                f"🚨 Potential prompt injection detected: "
-                f"'{cleaned[:100]}...'"
-            )
-            # We log but don't block — the system prompt should handle it
-            break
+    if _COMBINED_PATTERN.search(cleaned):
+        logger.warning(
+            f"🚨 Potential prompt injection detected: "
+            f"'{cleaned[:100]}...'"
+        )
+        # We log but don't block — the system prompt should handle it
 
     return True, cleaned
 
@@ -298,12 +369,11 @@ def validate_input_detailed(text: str) -> dict:
 
     cleaned = text.strip()
 
-    # Find suspicious patterns
-    suspicious = []
-    for pattern in _compiled_patterns:
-        match = pattern.search(cleaned)
-        if match:
-            suspicious.append(match.group())
+    # Find suspicious patterns: first hit per pattern, in pattern order
+    hits = {}
+    for match in _COMBINED_PATTERN.finditer(cleaned):
+        hits.setdefault(int(match.lastgroup[1:]), match.group())
+    suspicious = [hits[i] for i in sorted(hits)]
 
     return {
         "is_valid": is_valid,
@@ -327,7 +397,7 @@ def get_middleware_stats() -> dict:
         "config": {
             "max_input_chars": Config.MAX_INPUT_CHARS,
             "rate_limit": Config.RATE_LIMIT,
-            "suspicious_patterns_loaded": len(_compiled_patterns),
+            "suspicious_patterns_loaded": len(_SUSPICIOUS_PATTERNS),
             "admin_ids_count": len(Config.ADMIN_IDS),
         },
     }
\ No newline at end of file
@@ -59,11 +59,24 @@ Celebrate their progress! 📚🌟""",
 }
 
 
+# ── Per-mode system messages, built once at import ───────────
+# The HF router tokenizes server-side, so the reusable work here is the
+# system-message dict every turn would otherwise rebuild
+_SYSTEM_MESSAGES = {
+    mode: {"role": "system", "content": text} for mode, text in PROMPT_TEMPLATES.items()
+}
+
+
 def get_prompt(mode: str = "default") -> str:
     """Get system prompt by mode name. Falls back to default."""
     return PROMPT_TEMPLATES.get(mode, SYSTEM_PROMPT)
 
 
+def get_system_message(mode: str = "default") -> dict:
+    """Shared {"role": "system", ...} message for `mode`; treat it as read-only."""
+    return _SYSTEM_MESSAGES.get(mode, _SYSTEM_MESSAGES["default"])
+
+
 def list_modes() -> list[str]:
     """Return all available prompt modes."""
     return list(PROMPT_TEMPLATES.keys())
@@ -1,11 +1,70 @@
-from fastapi import FastAPI
+import hmac
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
+from telegram import Update
+from telegram.ext import Application
 import logging
 
+from src.config import Config
+from src.hf_client import close_client
+
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Telegram AI Bot Health Check")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The process-wide HF pool lives in hf_client; closing twice is a no-op
+    await close_client()
+
+
+# No docs/OpenAPI routes: this app only serves health probes and the webhook.
+# Dict returns (the probes) are encoded by orjson instead of stdlib json.
+app = FastAPI(
+    title="Telegram AI Bot Health Check",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    docs_url=None,
+    redoc_url=None,
+    openapi_url=None,
+)
 
 @app.get("/")
 @app.get("/health")
 async def health_check():
-    return {"status": "ok", "service": "Telegram AI Bot"}
\ No newline at end of file
+    return {"status": "ok", "service": "Telegram AI Bot"}
+
+
+def mount_webhook(application: Application):
+    """Expose the Telegram webhook route, feeding pushed updates straight into PTB's queue."""
+
+    bot_token = Config.BOT_TOKEN.encode()
+    secret = Config.WEBHOOK_SECRET.encode()
+
+    async def telegram_webhook(token: str, request: Request):
+        # Constant-time checks so response timing leaks nothing about either value
+        header = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not (
+            hmac.compare_digest(token.encode(), bot_token)
+            and hmac.compare_digest(header.encode(), secret)
+        ):
+            logger.warning("🚫 Webhook hit with invalid token")
+            return Response(status_code=403)
+
+        # Ack unparseable bodies with 200: any other status makes Telegram resend them forever
+        try:
+            payload = await request.json()
+            if not isinstance(payload, dict):
+                raise TypeError(f"expected a JSON object, got {type(payload).__name__}")
+            update = Update.de_json(payload, application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"⚠️ Dropping malformed webhook update: {e}")
+            return Response(status_code=200)
+
+        if update is not None:
+            await application.update_queue.put(update)
+        return Response(status_code=200)
+
+    app.add_api_route("/webhook/{token}", telegram_webhook, methods=["POST"])
+    logger.info("🔗 Webhook route mounted at /webhook/<token>")
@@ -0,0 +1,106 @@
+# src/telegram_limiter.py
+import time
+import asyncio
+import logging
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# ╔══════════════════════════════════════════════════════════╗
+# ║              🚦 TELEGRAM OUTBOUND LIMITER                ║
+# ╚══════════════════════════════════════════════════════════╝
+
+# Bot API ceilings: ~30 msg/s overall, ~1 msg/s per private chat, 20 msg/min per group
+GLOBAL_RATE = 25.0
+PRIVATE_RATE, PRIVATE_BURST = 1.0, 3
+GROUP_RATE, GROUP_BURST = 20 / 60, 20
+
+_MAX_BUCKETS = 4096
+
+
+class _Bucket:
+    """Token bucket that hands out reservations instead of blocking."""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """Take one token; return how many seconds the caller must wait for it."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        """True once the bucket would have refilled completely."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class TelegramLimiter:
+    """
+    Pace every send/edit through a global and a per-chat token bucket.
+
+    A RetryAfter from any call sets a shared backoff deadline, so one 429
+    pauses all in-flight streams instead of each retrying on its own.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE):
+        self._global = _Bucket(global_rate, global_rate)
+        self._chats: dict[int, _Bucket] = {}
+        self._backoff_until = 0.0
+
+    def _chat_bucket(self, chat_id: int, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_BUCKETS:
+                # Full buckets carry no state worth keeping
+                for cid in [cid for cid, b in self._chats.items() if b.idle(now)]:
+                    del self._chats[cid]
+            # Negative ids are groups/channels, which get the stricter limit
+            if chat_id < 0:
+                bucket = _Bucket(GROUP_RATE, GROUP_BURST)
+            else:
+                bucket = _Bucket(PRIVATE_RATE, PRIVATE_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def _acquire(self, chat_id: int):
+        now = time.monotonic()
+        wait = max(
+            self._backoff_until - now,
+            self._global.reserve(now),
+            self._chat_bucket(chat_id, now).reserve(now),
+        )
+        if wait > 0:
+            await asyncio.sleep(wait)
+        # A 429 may have landed while we slept
+        while (delay := self._backoff_until - time.monotonic()) > 0:
+            await asyncio.sleep(delay)
+
+    async def send(self, chat_id: int, func, *args, retries: int = 1, **kwargs):
+        """
+        Await `func(*args, **kwargs)` once the buckets allow it.
+
+        On RetryAfter the global backoff is raised and the call is retried up
+        to `retries` times; after that the RetryAfter propagates.
+        """
+        attempt = 0
+        while True:
+            await self._acquire(chat_id)
+            try:
+                return await func(*args, **kwargs)
+            except RetryAfter as e:
+                self._backoff_until = max(
+                    self._backoff_until, time.monotonic() + float(e.retry_after)
+                )
+                logger.warning(f"🚦 Telegram 429 — pausing all sends for {e.retry_after}s")
+                if attempt >= retries:
+                    raise
+                attempt += 1
+
+
+telegram_limiter = TelegramLimiter()